@@ -0,0 +1,219 @@
+# app/api.py
+"""Versioned JSON API (/api/v1) over the same queries as the HTML routes."""
+from datetime import date, datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette import status
+
+from app import idempotency, queries
+from app.db import connect
+
+router = APIRouter(prefix="/api/v1", tags=["api v1"], default_response_class=ORJSONResponse)
+
+# ---------- response models ----------
+class Person(BaseModel):
+    id: int
+    name: str
+    email: Optional[str] = None
+    created_at: datetime
+
+class Project(BaseModel):
+    id: int
+    code: Optional[str] = None
+    name: str
+    is_active: bool
+
+class TimeEntry(BaseModel):
+    id: int
+    work_date: date
+    hours: float
+    notes: Optional[str] = None
+    status: str
+    project_id: Optional[int] = None
+    project_name: Optional[str] = None
+    project_code: Optional[str] = None
+
+class WeekSummary(BaseModel):
+    person_id: int
+    year: int
+    week: int
+    start: date
+    end: date
+    total_hours: float
+    status: str
+    entries: List[TimeEntry]
+
+class ProjectHours(BaseModel):
+    project_id: Optional[int] = None
+    hours: float
+
+class WeekTotals(BaseModel):
+    person_id: int
+    person_name: Optional[str] = None
+    total_hours: float
+    entries: int
+    status: str
+    projects: List[ProjectHours]
+
+class ProjectMonth(BaseModel):
+    month: date
+    total_hours: float
+    approved_hours: float
+    entries: int
+    people: int
+    refreshed_at: datetime
+
+class ApprovalItem(BaseModel):
+    id: int
+    person_id: int
+    person_name: Optional[str] = None
+    work_date: date
+    hours: float
+    notes: Optional[str] = None
+    status: str
+    project_code: Optional[str] = None
+    project_name: Optional[str] = None
+
+class ApprovalPage(BaseModel):
+    items: List[ApprovalItem]
+    next_cursor: Optional[str] = None
+
+class StatusChange(BaseModel):
+    id: int
+    status: str
+
+class BatchDecision(BaseModel):
+    """Either `ids`, or `person_id` + `year` + `week` for a whole ISO week."""
+    action: Literal["approve", "reject"]
+    ids: List[int] = []
+    person_id: Optional[int] = None
+    year: Optional[int] = None
+    week: Optional[int] = None
+
+class BatchResult(BaseModel):
+    status: str
+    updated: int
+
+# ---------- routes ----------
+@router.get("/people", response_model=List[Person])
+async def api_people():
+    async with connect() as conn:
+        return await queries.list_people(conn)
+
+@router.get("/projects", response_model=List[Project])
+async def api_projects(active: bool = False):
+    async with connect() as conn:
+        return await queries.list_projects(conn, active_only=active)
+
+@router.get("/projects/{project_id}/months", response_model=List[ProjectMonth])
+async def api_project_months(project_id: int):
+    """Monthly rollup, as current as the last rollup scheduler tick (ROLLUP_SCHEDULER=1
+    or `python -m app.scheduler`); with no scheduler running it is not updated."""
+    async with connect() as conn:
+        return await queries.project_months(conn, project_id)
+
+@router.get("/time-entries", response_model=List[TimeEntry])
+async def api_time_entries(
+    person_id: int,
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+):
+    if date_to < date_from:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "'to' is before 'from'")
+    async with connect() as conn:
+        return await queries.fetch_entries(conn, person_id, date_from, date_to)
+
+@router.get("/people/{person_id}/weeks/{year}/{week}", response_model=WeekSummary)
+async def api_week(person_id: int, year: int, week: int):
+    try:
+        days = queries.iso_week_dates(year, week)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    async with connect() as conn:
+        entries = await queries.fetch_entries(conn, person_id, days[0], days[-1])
+    return {
+        "person_id": person_id,
+        "year": year,
+        "week": week,
+        "start": days[0],
+        "end": days[-1],
+        "total_hours": sum(float(e["hours"] or 0) for e in entries),
+        "status": queries.week_status(entries),
+        "entries": entries,
+    }
+
+@router.get("/weeks/{year}/{week}", response_model=List[WeekTotals])
+async def api_week_totals(year: int, week: int, person_id: Optional[int] = None):
+    """Everyone's hours and status for one ISO week, from weekly_summary."""
+    try:
+        queries.iso_week_dates(year, week)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    async with connect() as conn:
+        return await queries.week_totals(conn, year, week, person_id)
+
+@router.get("/approvals", response_model=ApprovalPage)
+async def api_approvals(
+    person_id: Optional[int] = None,
+    project_id: Optional[int] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    after: Optional[str] = None,
+    limit: int = Query(queries.APPROVALS_PAGE_SIZE, ge=1, le=queries.APPROVALS_MAX_PAGE_SIZE),
+):
+    """Submitted entries, keyset-paginated: pass `next_cursor` back as `after`."""
+    try:
+        if after:
+            queries.decode_cursor(after)
+    except ValueError:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"bad cursor {after!r}")
+    filters = queries.ApprovalFilter(person_id, project_id, date_from, date_to)
+    async with connect() as conn:
+        items, next_cursor = await queries.list_submitted(conn, filters, after, limit)
+    return {"items": items, "next_cursor": next_cursor}
+
+# POSTs honour an Idempotency-Key header (app/idempotency.py); responses are
+# built here rather than by FastAPI so the stored copy is byte-identical.
+async def _set_status(request: Request, entry_id: int, new_status: str):
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        if not await queries.set_entry_status(conn, entry_id, new_status):
+            raise HTTPException(status.HTTP_404_NOT_FOUND, f"time entry {entry_id} not found")
+        response = await claim.save(conn, ORJSONResponse({"id": entry_id, "status": new_status}))
+        await conn.commit()
+    return response
+
+@router.post("/approvals/{entry_id}/approve", response_model=StatusChange)
+async def api_approve(request: Request, entry_id: int):
+    return await _set_status(request, entry_id, queries.DECISIONS["approve"])
+
+@router.post("/approvals/{entry_id}/reject", response_model=StatusChange)
+async def api_reject(request: Request, entry_id: int):
+    return await _set_status(request, entry_id, queries.DECISIONS["reject"])
+
+@router.post("/approvals/batch", response_model=BatchResult)
+async def api_approvals_batch(request: Request, body: BatchDecision):
+    new_status = queries.DECISIONS[body.action]
+    by_week = body.person_id is not None and body.year and body.week
+    if not by_week and not body.ids:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "give ids or person_id/year/week")
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        if by_week:
+            try:
+                days = queries.iso_week_dates(body.year, body.week)
+            except ValueError as e:
+                raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+            updated = await queries.set_week_status(conn, body.person_id, days[0], days[-1], new_status)
+        else:
+            updated = await queries.set_status_many(conn, body.ids, new_status)
+        response = await claim.save(conn, ORJSONResponse({"status": new_status, "updated": updated}))
+        await conn.commit()
+    return response
@@ -0,0 +1,425 @@
+# app/datagen.py
+"""Deterministic synthetic time-entry data for load tests and query plans.
+
+    python -m app.datagen --people 2000 --weeks 52                # v2 tables
+    python -m app.datagen --target legacy --people 500 --jobs 8   # app/schema.sql tables
+    python -m app.datagen --target both --seed 7 --until today
+    python -m app.datagen --reset --target both --people 0        # only delete generated rows
+
+The same options and seed always produce the same rows (ids aside, which
+depend on what the tables already hold): each person draws from a Random
+seeded with (seed, person), so chunking and --jobs don't change the output.
+--until defaults to a fixed date for that reason; `--until today` gives
+current weeks instead.
+Entries are written with COPY, one chunk of people per transaction, --jobs
+chunks at a time in separate processes.
+
+What it models:
+- public holidays (fixed dates plus the Easter-based ones), a summer
+  vacation and one or two shorter breaks a year, ~2% sick days;
+- part-timers (about 1 in 5) on fewer or shorter days, and people joining
+  or leaving inside the window;
+- Zipf-like project popularity, a handful of projects per person, some
+  hours on no project (v2) / the internal project (legacy);
+- per-person submission habits and per-project approval speed (log-normal
+  lags) relative to --until: older weeks are approved, recent ones
+  submitted, the latest drafts; ~2% of legacy decisions are rejections.
+
+Generated people use @datagen.test emails and projects G-<seed>- codes,
+which is what --reset deletes. Afterwards `python -m app.scheduler --once`
+brings the v2 rollups up to date and `python -m app.reports` the legacy
+report views.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+import psycopg
+
+from app.db import CONNECT_KWARGS, db_url
+
+EMAIL_DOMAIN = "datagen.test"
+CODE_PREFIX = "G-"
+# fixed, so a bare run gives the same rows on any day; pass --until today for fresh weeks
+DEFAULT_UNTIL = date(2026, 6, 30)
+
+FIRST_NAMES = ("Ada", "Bo", "Carla", "Dev", "Emil", "Freja", "Gustav", "Hana", "Ida", "Jonas",
+               "Karin", "Lars", "Maja", "Niels", "Olga", "Per", "Rosa", "Sven", "Tove", "Ulla")
+LAST_NAMES = ("Andersen", "Berg", "Christensen", "Dahl", "Eriksen", "Falk", "Holm", "Jensen",
+              "Krogh", "Lund", "Madsen", "Nielsen", "Olsen", "Poulsen", "Rasmussen", "Skov")
+CLIENT_WORDS = ("Nordic", "Harbour", "Atlas", "Blue", "Granite", "Lumen", "Fjord", "Civic")
+CLIENT_KINDS = ("Logistics", "Energy", "Health", "Retail", "Bank", "Media", "Foods", "Labs")
+TASK_NAMES = ("Development", "Design", "Meetings", "Testing", "Support", "Documentation")
+NOTES = ("standup", "code review", "customer call", "bug fixing", "planning", "deploy",
+         "workshop", "onboarding", "research", "release prep")
+SOURCES = (("manual", 0.75), ("timer", 0.2), ("import", 0.05))
+
+class Plan(NamedTuple):
+    seed: int
+    start: date      # a Monday
+    until: date      # last day with entries; "now" for the status lags
+
+class Project(NamedTuple):
+    code: str
+    name: str
+    client: int           # index into the client list
+    weight: float         # popularity; 0 = never picked by popularity (internal)
+    active: bool
+    billable: bool
+    budget_hours: Optional[float]
+    tasks: int
+    approve_days: float   # median approval lag
+
+class Person(NamedTuple):
+    name: str
+    email: str
+    role: str
+    projects: tuple       # project indexes, most used first
+
+# ---------- calendar ----------
+def easter_sunday(year: int) -> date:
+    """Anonymous Gregorian algorithm."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+@lru_cache(maxsize=None)
+def holidays(year: int) -> FrozenSet[date]:
+    easter = easter_sunday(year)
+    fixed = [date(year, 1, 1), date(year, 12, 24), date(year, 12, 25), date(year, 12, 26), date(year, 12, 31)]
+    # Maundy Thursday, Good Friday, Easter Monday, Ascension, Whit Monday
+    return frozenset(fixed + [easter + timedelta(days=d) for d in (-3, -2, 1, 39, 50)])
+
+def days_off(rng: random.Random, start: date, end: date) -> Set[date]:
+    """Vacation blocks: two or three summer weeks, plus one or two single weeks."""
+    off: Set[date] = set()
+    for year in range(start.year, end.year + 1):
+        blocks = [(date(year, 6, 15) + timedelta(days=rng.randrange(56)), rng.choice((14, 21)))]
+        for _ in range(rng.choice((1, 2))):
+            blocks.append((date(year, 1, 2) + timedelta(days=rng.randrange(350)), 7))
+        for first, days in blocks:
+            off.update(first + timedelta(days=d) for d in range(days))
+    return off
+
+# ---------- reference data ----------
+def make_clients(seed: int, n: int) -> List[str]:
+    rng = random.Random(f"{seed}:clients")
+    return [f"{rng.choice(CLIENT_WORDS)} {rng.choice(CLIENT_KINDS)} {i + 1} (datagen)" for i in range(n)]
+
+def make_projects(seed: int, n: int, clients: int) -> List[Project]:
+    """Index 0 is the internal project; the rest follow a 1/rank^1.1 popularity curve."""
+    rng = random.Random(f"{seed}:projects")
+    projects = [Project(f"{CODE_PREFIX}{seed}-INT", "Internal", 0, 0.0, True, False, None, 3, 1.0)]
+    client_weights = [1 / (c + 1) for c in range(clients)]
+    for i in range(1, n + 1):
+        projects.append(Project(
+            code=f"{CODE_PREFIX}{seed}-{i:04d}",
+            name=f"{rng.choice(CLIENT_WORDS)} {rng.choice(TASK_NAMES).lower()} {i}",
+            client=rng.choices(range(clients), client_weights)[0],
+            weight=1 / i ** 1.1,
+            active=rng.random() > 0.15,
+            billable=rng.random() > 0.1,
+            budget_hours=round(rng.lognormvariate(math.log(800), 0.9), -1) if rng.random() > 0.2 else None,
+            tasks=rng.randint(2, len(TASK_NAMES)),
+            approve_days=rng.lognormvariate(math.log(2), 0.6),
+        ))
+    return projects
+
+def make_person(seed: int, k: int, projects: List[Project]) -> Person:
+    rng = random.Random(f"{seed}:person:{k}")
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    role = rng.choices(("contributor", "lead", "finance", "admin"), (0.9, 0.06, 0.03, 0.01))[0]
+    weights = [p.weight for p in projects]
+    picked = rng.choices(range(len(projects)), weights, k=1 + min(int(rng.expovariate(0.5)), 6))
+    return Person(f"{first} {last}", f"{first}.{last}.{seed}-{k}@{EMAIL_DOMAIN}".lower(), role,
+                  tuple(dict.fromkeys(picked)))
+
+# ---------- entries ----------
+class Entry(NamedTuple):
+    project: Optional[int]   # project index; None = no project
+    task: int
+    work_date: date
+    hours: float
+    billable: bool
+    notes: Optional[str]
+    status: str              # draft|submitted|approved|rejected
+    batch: Optional[int]     # submitted week, per person
+    source: str
+    created_at: datetime
+    updated_at: datetime
+
+def _at(day: date, hours: float) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(hours=hours)
+
+def _split(rng: random.Random, quarters: int, parts: int) -> List[int]:
+    parts = max(1, min(parts, quarters))
+    cuts = sorted(rng.sample(range(1, quarters), parts - 1)) if parts > 1 else []
+    bounds = [0, *cuts, quarters]
+    return [b - a for a, b in zip(bounds, bounds[1:])]
+
+def person_entries(plan: Plan, projects: List[Project], k: int) -> List[Entry]:
+    """Every entry of person `k`; depends only on (plan, projects, k)."""
+    person = make_person(plan.seed, k, projects)
+    rng = random.Random(f"{plan.seed}:entries:{k}")
+    span = (plan.until - plan.start).days + 1
+    first_day, last_day = plan.start, plan.until
+    churn = rng.random()
+    if churn < 0.1:
+        first_day += timedelta(days=rng.randrange(span))
+    elif churn < 0.15:
+        last_day = plan.start + timedelta(days=rng.randrange(span))
+    fte = rng.choice((0.5, 0.6, 0.8)) if rng.random() < 0.2 else 1.0
+    if fte < 1 and rng.random() < 0.5:
+        workdays, day_hours = set(rng.sample(range(5), round(5 * fte))), 7.5
+    else:
+        workdays, day_hours = set(range(5)), 7.5 * fte
+    mine = person.projects
+    mine_weights = [1 / (j + 1) for j in range(len(mine))]
+    no_project = rng.uniform(0, 0.15)
+    submit_days = rng.lognormvariate(math.log(1.5), 0.7)
+    off = days_off(rng, plan.start, plan.until)
+    now = _at(plan.until, 24)
+
+    entries: List[Entry] = []
+    week = 0
+    monday = plan.start
+    while monday <= plan.until:
+        submitted_at = _at(monday + timedelta(days=7), 9) + timedelta(days=rng.lognormvariate(math.log(submit_days), 0.9))
+        decided = {}   # project index -> decision time, drawn once per week
+        for d in range(7):
+            day = monday + timedelta(days=d)
+            if (day < first_day or day > last_day or d not in workdays
+                    or day in holidays(day.year) or day in off or rng.random() < 0.02):
+                continue
+            quarters = round(min(max(rng.gauss(day_hours, 0.6), 1), 11) * 4)
+            for piece in _split(rng, quarters, rng.choices((1, 2, 3), (0.5, 0.35, 0.15))[0]):
+                project = None if rng.random() < no_project else rng.choices(mine, mine_weights)[0]
+                p = projects[project or 0]
+                if project not in decided:
+                    decided[project] = submitted_at + timedelta(days=rng.lognormvariate(math.log(p.approve_days), 0.8))
+                created_at = _at(day, rng.uniform(9, 19))
+                if submitted_at > now:
+                    status, updated_at = "draft", created_at
+                elif decided[project] > now:
+                    status, updated_at = "submitted", submitted_at
+                else:
+                    status = "rejected" if rng.random() < 0.02 else "approved"
+                    updated_at = decided[project]
+                entries.append(Entry(
+                    project=project,
+                    task=rng.randrange(p.tasks),
+                    work_date=day,
+                    hours=piece / 4,
+                    billable=p.billable != (rng.random() < 0.1),
+                    notes=rng.choice(NOTES) if rng.random() < 0.3 else None,
+                    status=status,
+                    batch=k * 10_000 + week if status != "draft" else None,
+                    source=rng.choices([s for s, _ in SOURCES], [w for _, w in SOURCES])[0],
+                    created_at=created_at,
+                    updated_at=updated_at,
+                ))
+        monday += timedelta(days=7)
+        week += 1
+    return entries
+
+# ---------- loading ----------
+class Ids(NamedTuple):
+    """Database ids for the generated people/projects, by index; empty if that target is off."""
+    v2_people: List[int]
+    v2_projects: List[int]
+    users: List[int]
+    projects: List[int]
+    tasks: List[List[int]]
+
+def _ids_by(cur, query: str, keys: List[str]) -> List[int]:
+    found = dict(cur.execute(query, (keys,)).fetchall())
+    return [found[key] for key in keys]
+
+def insert_v2_reference(cur, people: List[Person], projects: List[Project], plan: Plan):
+    with cur.copy("COPY v2_people (name, email) FROM STDIN") as copy:
+        for person in people:
+            copy.write_row((person.name, person.email))
+    with cur.copy("COPY v2_projects (code, name, is_active) FROM STDIN") as copy:
+        for p in projects:
+            copy.write_row((p.code, p.name, p.active))
+    people_ids = _ids_by(cur, "SELECT email, id FROM v2_people WHERE email = ANY(%s);", [p.email for p in people])
+    project_ids = _ids_by(cur, "SELECT code, id FROM v2_projects WHERE code = ANY(%s);", [p.code for p in projects])
+    # Every bucket the load can touch is marked dirty up front, so the
+    # rollup trigger in the parallel COPYs finds its rows already there and
+    # only key-share locks them (which sessions don't block each other on)
+    # instead of inserting the same keys from several sessions. The markers
+    # stay locked until each chunk commits, so a rollup pass running during
+    # the load can't consume them early.
+    cur.execute("""
+        INSERT INTO rollup_dirty (project_id, month)
+        SELECT p, m::date
+          FROM unnest(%s::bigint[]) p,
+               generate_series(date_trunc('month', %s::date), %s::date, interval '1 month') m
+        ON CONFLICT DO NOTHING;
+    """, (project_ids, plan.start, plan.until))
+    return people_ids, project_ids
+
+def insert_legacy_reference(cur, people: List[Person], projects: List[Project], clients: List[str], plan: Plan):
+    with cur.copy("COPY clients (name, currency) FROM STDIN") as copy:
+        for name in clients:
+            copy.write_row((name, "DKK"))
+    client_ids = [r[0] for r in cur.execute(
+        "SELECT id FROM clients WHERE name = ANY(%s) ORDER BY id DESC LIMIT %s;", (clients, len(clients)))][::-1]
+    with cur.copy("COPY users (name, email, role) FROM STDIN") as copy:
+        for person in people:
+            copy.write_row((person.name, person.email, person.role))
+    user_ids = _ids_by(cur, "SELECT email, id FROM users WHERE email = ANY(%s);", [p.email for p in people])
+    leads = [uid for uid, person in zip(user_ids, people) if person.role == "lead"] or user_ids[:1]
+    rng = random.Random(f"{plan.seed}:legacy")
+    with cur.copy("COPY projects (client_id, code, name, start_date, budget_hours, status, approver_user_id) "
+                  "FROM STDIN") as copy:
+        for p in projects:
+            copy.write_row((client_ids[p.client], p.code, p.name, plan.start, p.budget_hours,
+                            "active" if p.active else "closed", rng.choice(leads) if leads else None))
+    project_ids = _ids_by(cur, "SELECT code, id FROM projects WHERE code = ANY(%s);", [p.code for p in projects])
+    with cur.copy("COPY tasks (project_id, name, billable_default) FROM STDIN") as copy:
+        for pid, p in zip(project_ids, projects):
+            for name in TASK_NAMES[:p.tasks]:
+                copy.write_row((pid, name, p.billable))
+    tasks: Dict[int, List[int]] = {}
+    for task_id, pid in cur.execute("SELECT id, project_id FROM tasks WHERE project_id = ANY(%s) ORDER BY id;",
+                                    (project_ids,)):
+        tasks.setdefault(pid, []).append(task_id)
+    with cur.copy("COPY project_assignments (project_id, user_id) FROM STDIN") as copy:
+        for uid, person in zip(user_ids, people):
+            for i in {0, *person.projects}:
+                copy.write_row((project_ids[i], uid))
+    return user_ids, project_ids, [tasks[pid] for pid in project_ids]
+
+LEGACY_APPROVALS_SQL = """
+    INSERT INTO approvals (time_entry_id, approver_id, decision, decided_at)
+    SELECT te.id, p.approver_user_id, CASE te.state WHEN 'approved' THEN 'approve' ELSE 'reject' END, te.updated_at
+      FROM time_entries te
+      JOIN projects p ON p.id = te.project_id
+     WHERE te.user_id = ANY(%s) AND te.state IN ('approved', 'rejected')
+       AND p.approver_user_id IS NOT NULL;
+"""
+
+def load_chunk(url: str, plan: Plan, projects: List[Project], ids: Ids, people: range) -> int:
+    """Generate and COPY the entries of `people` (indexes) in one transaction; returns entries per target."""
+    entries = {k: person_entries(plan, projects, k) for k in people}
+    with psycopg.connect(url, **CONNECT_KWARGS) as conn:
+        with conn.cursor() as cur:
+            if ids.v2_people:
+                with cur.copy("COPY v2_time_entries (person_id, project_id, work_date, hours, notes, status, "
+                              "source, created_at, updated_at) FROM STDIN") as copy:
+                    for k, person_rows in entries.items():
+                        for e in person_rows:
+                            project_id = ids.v2_projects[e.project] if e.project is not None else None
+                            # v2 has no rejected state: a rejection sends the entry back to draft
+                            status = "draft" if e.status == "rejected" else e.status
+                            copy.write_row((ids.v2_people[k], project_id, e.work_date, e.hours, e.notes,
+                                            status, e.source, e.created_at, e.updated_at))
+            if ids.users:
+                with cur.copy("COPY time_entries (user_id, project_id, task_id, work_date, hours, billable, notes, "
+                              "state, submit_batch_id, source, created_at, updated_at) FROM STDIN") as copy:
+                    for k, person_rows in entries.items():
+                        for e in person_rows:
+                            p = e.project or 0
+                            copy.write_row((ids.users[k], ids.projects[p], ids.tasks[p][e.task], e.work_date,
+                                            e.hours, e.billable, e.notes, e.status, e.batch, e.source,
+                                            e.created_at, e.updated_at))
+                cur.execute(LEGACY_APPROVALS_SQL, ([ids.users[k] for k in people],))
+        conn.commit()
+    return sum(len(rows) for rows in entries.values())
+
+RESET_SQL = {
+    "v2": [
+        f"DELETE FROM v2_people WHERE email LIKE '%@{EMAIL_DOMAIN}';",
+        f"DELETE FROM v2_projects WHERE code LIKE '{CODE_PREFIX}%';",
+    ],
+    "legacy": [
+        f"""DELETE FROM time_entries
+             WHERE user_id IN (SELECT id FROM users WHERE email LIKE '%@{EMAIL_DOMAIN}')
+                OR project_id IN (SELECT id FROM projects WHERE code LIKE '{CODE_PREFIX}%');""",
+        f"DELETE FROM projects WHERE code LIKE '{CODE_PREFIX}%';",
+        f"DELETE FROM users WHERE email LIKE '%@{EMAIL_DOMAIN}';",
+        "DELETE FROM clients c WHERE name LIKE '% (datagen)' AND NOT EXISTS (SELECT 1 FROM projects p WHERE p.client_id = c.id);",
+    ],
+}
+
+ANALYZE_TABLES = {
+    "v2": ("v2_people", "v2_projects", "v2_time_entries", "weekly_summary", "rollup_dirty"),
+    "legacy": ("clients", "users", "projects", "tasks", "project_assignments", "time_entries", "approvals"),
+}
+
+# ---------- CLI ----------
+def _day(value: str) -> date:
+    return date.today() if value == "today" else date.fromisoformat(value)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Generate deterministic synthetic time entries.")
+    ap.add_argument("--target", choices=("v2", "legacy", "both"), default="v2")
+    ap.add_argument("--people", type=int, default=1000)
+    ap.add_argument("--projects", type=int, default=100)
+    ap.add_argument("--clients", type=int, default=20, help="legacy only")
+    ap.add_argument("--weeks", type=int, default=26, help="weeks of history, ending with --until")
+    ap.add_argument("--until", type=_day, default=DEFAULT_UNTIL,
+                    help=f"last day, YYYY-MM-DD or 'today' (default {DEFAULT_UNTIL})")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1), help="parallel COPY processes")
+    ap.add_argument("--chunk", type=int, default=100, help="people per transaction")
+    ap.add_argument("--reset", action="store_true", help="delete previously generated rows first")
+    args = ap.parse_args()
+
+    targets = ("v2", "legacy") if args.target == "both" else (args.target,)
+    monday = args.until - timedelta(days=args.until.weekday())
+    plan = Plan(args.seed, monday - timedelta(weeks=args.weeks - 1), args.until)
+    projects = make_projects(args.seed, args.projects, args.clients)
+    people = [make_person(args.seed, k, projects) for k in range(args.people)]
+    url = db_url()
+    started = time.perf_counter()
+
+    with psycopg.connect(url, **CONNECT_KWARGS) as conn:
+        with conn.cursor() as cur:
+            if args.reset:
+                for target in targets:
+                    for stmt in RESET_SQL[target]:
+                        cur.execute(stmt)
+            if not people:
+                conn.commit()
+                return
+            v2_people = v2_projects = users = legacy_projects = tasks = []
+            try:
+                if "v2" in targets:
+                    v2_people, v2_projects = insert_v2_reference(cur, people, projects, plan)
+                if "legacy" in targets:
+                    users, legacy_projects, tasks = insert_legacy_reference(
+                        cur, people, projects, make_clients(args.seed, args.clients), plan)
+            except psycopg.errors.UniqueViolation:
+                raise SystemExit(f"data for --seed {args.seed} is already loaded; pass --reset or another seed")
+        conn.commit()
+    ids = Ids(v2_people, v2_projects, users, legacy_projects, tasks)
+
+    chunks = [range(i, min(i + args.chunk, args.people)) for i in range(0, args.people, args.chunk)]
+    rows = 0
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        futures = [pool.submit(load_chunk, url, plan, projects, ids, chunk) for chunk in chunks]
+        for future in futures:
+            rows += future.result()
+
+    with psycopg.connect(url, autocommit=True, **CONNECT_KWARGS) as conn:
+        for target in targets:
+            conn.execute(f"ANALYZE {', '.join(ANALYZE_TABLES[target])};")
+    print(f"{args.people} people, {len(projects)} projects, {rows} entries per target "
+          f"({', '.join(targets)}) {plan.start}..{plan.until} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# app/db.py
+import asyncio
+import os
+import sys
+from typing import Callable, Dict, Optional
+
+import psycopg
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool
+
+# ---------- config ----------
+def db_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        print("ERROR: DATABASE_URL not set", file=sys.stderr)
+        raise RuntimeError("DATABASE_URL not set")
+    return url
+
+def env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    return int(raw) if raw not in (None, "") else default
+
+def env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    return float(raw) if raw not in (None, "") else default
+
+def env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw in (None, ""):
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+# Force search_path to public so we always see the expected schema/tables.
+# Passed as a startup option, so it costs nothing per checkout.
+CONNECT_KWARGS = {"options": "-c search_path=public"}
+
+# Server-side prepared statements (see app.queries.hot). DB_PREPARE=0 turns
+# them off for PgBouncer in transaction mode (before 1.21, or without
+# max_prepared_statements), where the next transaction may run on a server
+# connection that never saw the PREPARE.
+DB_PREPARE = env_bool("DB_PREPARE", True)
+if not DB_PREPARE:
+    CONNECT_KWARGS["prepare_threshold"] = None
+
+# ---------- pool ----------
+_pool: Optional[AsyncConnectionPool] = None
+
+def create_pool(configure: Optional[Callable] = None) -> AsyncConnectionPool:
+    """Build the process-wide pool from DB_POOL_* env vars (not opened yet).
+
+    `configure(conn)` runs once on each new connection.
+    """
+    return AsyncConnectionPool(
+        db_url(),
+        min_size=env_int("DB_POOL_MIN_SIZE", 1),
+        max_size=env_int("DB_POOL_MAX_SIZE", 10),
+        max_idle=env_float("DB_POOL_MAX_IDLE", 240.0),
+        max_lifetime=env_float("DB_POOL_MAX_LIFETIME", 3600.0),
+        timeout=env_float("DB_POOL_TIMEOUT", 30.0),
+        # Optional health check on checkout: costs one round trip, but never
+        # hands out a connection the server (or an autosuspend) already dropped.
+        check=AsyncConnectionPool.check_connection if env_bool("DB_POOL_CHECK", False) else None,
+        kwargs=CONNECT_KWARGS,
+        configure=configure,
+        name="app",
+        open=False,
+    )
+
+async def open_pool(configure: Optional[Callable] = None) -> AsyncConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = create_pool(configure)
+        await _pool.open(wait=env_bool("DB_POOL_WAIT", False))
+    return _pool
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def get_pool() -> AsyncConnectionPool:
+    if _pool is None:
+        raise RuntimeError("connection pool is not open")
+    return _pool
+
+def connect():
+    """Check out a pooled connection: `async with connect() as conn: ...`"""
+    return get_pool().connection()
+
+# ---------- LISTEN/NOTIFY ----------
+async def listen_forever(
+    handlers: Dict[str, Callable[[str], None]],
+    on_connect: Optional[Callable[[], None]] = None,
+) -> None:
+    """Dispatch NOTIFY payloads to handlers[channel] on one dedicated connection.
+
+    Runs until cancelled and reconnects on failure. Notifications sent while
+    disconnected are lost, so `on_connect` runs after every (re)connect to let
+    callers resync.
+    """
+    delay = 1.0
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                db_url(), autocommit=True, **CONNECT_KWARGS
+            ) as conn:
+                for channel in handlers:
+                    await conn.execute(sql.SQL("LISTEN {};").format(sql.Identifier(channel)))
+                if on_connect:
+                    on_connect()
+                delay = 1.0
+                async for notify in conn.notifies():
+                    handler = handlers.get(notify.channel)
+                    if handler:
+                        handler(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"WARNING: listener connection lost ({e}); retrying in {delay:.0f}s", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
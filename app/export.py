@@ -0,0 +1,177 @@
+# app/export.py
+"""Streaming export of v2 time entries (joined with people and projects).
+
+    GET /export/time-entries?from=2026-01-01&to=2026-01-31&format=csv
+    python -m app.export --from 2026-01-01 --to 2026-01-31 --format parquet -o jan.parquet
+
+CSV is produced by the server with `COPY ... TO STDOUT` and passed through
+chunk by chunk. Parquet reads a server-side cursor in fixed-size batches and
+emits one row group per batch. Either way memory stays flat no matter how
+many rows the range holds. Parquet needs the optional `pyarrow` package.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date
+from typing import AsyncIterator
+
+import psycopg
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from psycopg import sql
+from starlette import status
+
+from app.db import CONNECT_KWARGS, connect, db_url
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet export is optional
+    pa = pq = None
+
+router = APIRouter()
+
+BATCH_ROWS = 10_000
+
+EXPORT_SQL = sql.SQL("""
+    SELECT te.id, te.work_date, te.person_id, pe.name AS person_name, pe.email AS person_email,
+           te.project_id, p.code AS project_code, p.name AS project_name,
+           te.hours, te.status, te.notes, te.created_at
+      FROM v2_time_entries te
+ LEFT JOIN v2_people pe  ON pe.id = te.person_id
+ LEFT JOIN v2_projects p ON p.id = te.project_id
+     WHERE te.work_date BETWEEN {start} AND {end}
+  ORDER BY te.work_date, te.id
+""")
+
+def parquet_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("work_date", pa.date32()),
+        ("person_id", pa.int64()),
+        ("person_name", pa.string()),
+        ("person_email", pa.string()),
+        ("project_id", pa.int64()),
+        ("project_code", pa.string()),
+        ("project_name", pa.string()),
+        ("hours", pa.decimal128(5, 2)),
+        ("status", pa.string()),
+        ("notes", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+    ])
+
+def export_query(start: date, end: date) -> sql.Composed:
+    return EXPORT_SQL.format(start=sql.Literal(start), end=sql.Literal(end))
+
+async def stream_csv(conn, start: date, end: date) -> AsyncIterator[bytes]:
+    """CSV with a header row, straight from COPY."""
+    copy_sql = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(export_query(start, end))
+    async with conn.cursor() as cur:
+        async with cur.copy(copy_sql) as copy:
+            async for chunk in copy:
+                yield bytes(chunk)
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain()."""
+
+    def __init__(self) -> None:
+        self._parts: list = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+async def stream_parquet(conn, start: date, end: date) -> AsyncIterator[bytes]:
+    """Parquet file, one row group per BATCH_ROWS rows from a server-side cursor."""
+    if pa is None:
+        raise RuntimeError("parquet export needs pyarrow (pip install pyarrow)")
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    async with conn.cursor(name="export_time_entries") as cur:
+        await cur.execute(export_query(start, end))
+        while True:
+            rows = await cur.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+}
+
+@router.get("/export/time-entries")
+async def export_time_entries(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    format: str = "csv",
+) -> StreamingResponse:
+    if format not in FORMATS:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"format must be one of {', '.join(FORMATS)}")
+    if format == "parquet" and pa is None:
+        raise HTTPException(status.HTTP_501_NOT_IMPLEMENTED, "parquet export needs pyarrow installed")
+    if date_to < date_from:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "'to' is before 'from'")
+    produce, media_type = FORMATS[format]
+
+    async def body() -> AsyncIterator[bytes]:
+        # The pooled connection is held only while the response streams.
+        async with connect() as conn:
+            async for chunk in produce(conn, date_from, date_to):
+                yield chunk
+
+    filename = f"time-entries_{date_from}_{date_to}.{format}"
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# ---------- CLI ----------
+async def _main(args: argparse.Namespace) -> None:
+    produce, _ = FORMATS[args.format]
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        async with await psycopg.AsyncConnection.connect(db_url(), **CONNECT_KWARGS) as conn:
+            async for chunk in produce(conn, args.date_from, args.date_to):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Export v2 time entries for a date range.")
+    ap.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True)
+    ap.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True)
+    ap.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    ap.add_argument("-o", "--output", default="-", help="file to write (default: stdout)")
+    args = ap.parse_args()
+    if args.format == "parquet" and pa is None:
+        ap.error("parquet export needs pyarrow (pip install pyarrow)")
+    if args.format == "parquet" and args.output == "-":
+        ap.error("parquet needs -o FILE")
+    asyncio.run(_main(args))
+
+if __name__ == "__main__":
+    main()
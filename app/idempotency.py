@@ -0,0 +1,156 @@
+# app/idempotency.py
+"""Idempotency keys for the POST routes.
+
+static/forms.js adds a fresh key to each form submission as a hidden field
+(nothing is rendered server-side, so cached pages hold no keys); scripts and
+API clients send an Idempotency-Key header instead, which wins.
+A route claims the key in the same transaction as its writes and stores its
+response there before committing, so:
+
+- a retry after the commit gets the stored response back (marked
+  Idempotent-Replayed: true) and writes nothing;
+- a retry while the first attempt is still running waits on the key's
+  primary key until it commits (then replays) or rolls back (then runs as
+  the first attempt);
+- reusing a key for a different request is a 422.
+
+Requests without a key behave as before. Keys older than
+IDEMPOTENCY_TTL_HOURS are purged in the background by claim() itself, at
+most every IDEMPOTENCY_PURGE_SECONDS per process and PURGE_BATCH keys at a
+time, so no separate job (or ROLLUP_SCHEDULER) is needed.
+"""
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import Response
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from starlette import status
+
+from app.db import connect, env_float
+from app.queries import execute, hot
+
+FIELD = "idempotency_key"
+HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+TTL_HOURS = env_float("IDEMPOTENCY_TTL_HOURS", 24.0)
+PURGE_SECONDS = env_float("IDEMPOTENCY_PURGE_SECONDS", 300.0)
+PURGE_BATCH = 1000
+
+# recomputed when the response is replayed
+_NOT_STORED = {b"content-length", b"server-timing"}
+
+CLAIM_SQL = hot("""
+    INSERT INTO v2_idempotency_keys (key, fingerprint) VALUES (%s, %s)
+    ON CONFLICT (key) DO NOTHING RETURNING key;
+""")
+STORED_SQL = hot("SELECT fingerprint, status, headers, body FROM v2_idempotency_keys WHERE key=%s;")
+SAVE_SQL = hot("UPDATE v2_idempotency_keys SET status=%s, headers=%s, body=%s WHERE key=%s;")
+# bounded, and skips keys a running request holds
+PURGE_SQL = """
+    DELETE FROM v2_idempotency_keys
+     WHERE key IN (SELECT key FROM v2_idempotency_keys
+                    WHERE created_at < now() - make_interval(secs => %s)
+                    LIMIT %s
+                      FOR UPDATE SKIP LOCKED);
+"""
+
+_next_purge = 0.0
+_purges: set = set()   # running purge tasks, referenced until done
+
+def _is_form(request: Request) -> bool:
+    return request.headers.get("content-type", "").startswith(
+        ("application/x-www-form-urlencoded", "multipart/form-data"))
+
+async def fingerprint(request: Request) -> str:
+    """Digest of what the request asks for: method, URL and body, minus the key."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    if _is_form(request):
+        # FastAPI has parsed the form already; request.form() returns it
+        for name, value in (await request.form()).multi_items():
+            if name == FIELD:
+                continue
+            if isinstance(value, UploadFile):
+                value = f"{value.filename}:{value.size}"
+            h.update(json.dumps([name, value]).encode())
+    else:
+        h.update(await request.body())
+    return h.hexdigest()
+
+class Claim:
+    """What claim() found: `replay` is the stored response if the key was
+    used before; otherwise the caller owns `key` (None: no key sent)."""
+
+    __slots__ = ("key", "replay")
+
+    def __init__(self, key: Optional[str] = None, replay: Optional[Response] = None) -> None:
+        self.key = key
+        self.replay = replay
+
+    async def save(self, conn, response: Response) -> Response:
+        """Store `response` under the key; call before committing. Returns it."""
+        if self.key is not None:
+            headers = [[k.decode("latin-1"), v.decode("latin-1")]
+                       for k, v in response.raw_headers if k not in _NOT_STORED]
+            async with conn.cursor() as cur:
+                await execute(cur, SAVE_SQL, (response.status_code, Jsonb(headers), bytes(response.body), self.key))
+        return response
+
+async def claim(conn, request: Request) -> Claim:
+    """Claim the request's key in conn's transaction, or load what it stored."""
+    _purge_if_due()
+    key = request.headers.get(HEADER)
+    if key is None and _is_form(request):
+        key = (await request.form()).get(FIELD)
+    if not key:
+        return Claim()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"idempotency key longer than {MAX_KEY_LENGTH}")
+    digest = await fingerprint(request)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, CLAIM_SQL, (key, digest))
+        if await cur.fetchone():
+            return Claim(key)
+        await execute(cur, STORED_SQL, (key,))
+        stored = await cur.fetchone()
+    if stored is None or stored["status"] is None:
+        raise HTTPException(status.HTTP_409_CONFLICT, "idempotency key already used")
+    if stored["fingerprint"] != digest:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "idempotency key reused for a different request")
+    replay = Response(stored["body"], status_code=stored["status"])
+    replay.raw_headers += [(k.encode("latin-1"), v.encode("latin-1")) for k, v in stored["headers"]]
+    replay.headers["idempotent-replayed"] = "true"
+    return Claim(key, replay)
+
+async def purge(conn) -> int:
+    """Delete up to PURGE_BATCH keys past IDEMPOTENCY_TTL_HOURS; returns how many. Commits."""
+    async with conn.cursor() as cur:
+        await cur.execute(PURGE_SQL, (TTL_HOURS * 3600, PURGE_BATCH))
+        deleted = cur.rowcount
+    await conn.commit()
+    return deleted
+
+async def _purge() -> None:
+    try:
+        async with connect() as conn:
+            await purge(conn)
+    except Exception as e:
+        print(f"WARNING: idempotency key purge failed ({e})", file=sys.stderr)
+
+def _purge_if_due() -> None:
+    """Start a background purge on a connection of its own if the last one
+    in this process was PURGE_SECONDS ago; the request doesn't wait for it."""
+    global _next_purge
+    now = time.monotonic()
+    if now < _next_purge:
+        return
+    _next_purge = now + PURGE_SECONDS
+    task = asyncio.get_running_loop().create_task(_purge())
+    _purges.add(task)
+    task.add_done_callback(_purges.discard)
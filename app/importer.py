@@ -0,0 +1,282 @@
+# app/importer.py
+"""Bulk import of time entries from CSV.
+
+    POST /import/time-entries        (multipart: file=@entries.csv, target=v2|legacy)
+    python -m app.importer entries.csv [--target legacy]
+
+The file is streamed into a temporary staging table with `COPY ... FROM
+STDIN`, checked with a handful of set-based queries (unknown people or
+projects, malformed dates/hours, bad statuses), and merged into the target
+table in the same transaction, so an import lands completely or not at all.
+Rows identical to an earlier import are skipped, which makes re-running the
+same file a no-op.
+
+Targets and their CSV headers (extra columns, e.g. from /export, are ignored):
+
+    v2      person_email, work_date, hours [, project_code, notes, status]
+    legacy  user_email, project_code, work_date, hours
+            [, client, task, billable, notes, state]   -> time_entries (app/schema.sql)
+"""
+import argparse
+import asyncio
+import re
+import sys
+from typing import AsyncIterator, Dict, List, NamedTuple, Tuple
+
+import psycopg
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from psycopg import sql
+from starlette import status
+
+from app.db import CONNECT_KWARGS, connect, db_url
+
+router = APIRouter()
+
+CHUNK_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 50
+
+class Target(NamedTuple):
+    required: Tuple[str, ...]
+    optional: Tuple[str, ...]
+    # Each yields (n, message) for bad staging rows; `s` is the staging table.
+    checks: str
+    # Inserts the staged rows that aren't already there; rowcount = inserted.
+    merge: str
+
+V2 = Target(
+    required=("person_email", "work_date", "hours"),
+    optional=("project_code", "notes", "status"),
+    checks="""
+        SELECT s.n, 'missing ' || c FROM s,
+               LATERAL (VALUES ('person_email', s.person_email), ('work_date', s.work_date), ('hours', s.hours)) v(c, val)
+         WHERE v.val IS NULL
+        UNION ALL
+        SELECT n, 'bad work_date ' || quote_literal(work_date) FROM s
+         WHERE work_date IS NOT NULL AND NOT pg_input_is_valid(work_date, 'date')
+        UNION ALL
+        SELECT n, 'bad hours ' || quote_literal(hours) FROM s
+         WHERE hours IS NOT NULL
+           AND CASE WHEN pg_input_is_valid(hours, 'numeric(5,2)') THEN hours::numeric < 0 ELSE TRUE END
+        UNION ALL
+        SELECT n, 'bad status ' || quote_literal(status) FROM s
+         WHERE status NOT IN ('draft', 'submitted', 'approved')
+        UNION ALL
+        SELECT s.n, 'unknown person ' || quote_literal(s.person_email) FROM s
+     LEFT JOIN v2_people pe ON lower(pe.email) = lower(s.person_email)
+         WHERE s.person_email IS NOT NULL AND pe.id IS NULL
+        UNION ALL
+        SELECT s.n, 'unknown project ' || quote_literal(s.project_code) FROM s
+     LEFT JOIN v2_projects p ON p.code = s.project_code
+         WHERE s.project_code IS NOT NULL AND p.id IS NULL
+    """,
+    merge="""
+        INSERT INTO v2_time_entries (person_id, project_id, work_date, hours, notes, status, source)
+        SELECT pe.id, p.id, s.work_date::date, s.hours::numeric(5,2), s.notes,
+               COALESCE(s.status, 'draft'), 'import'
+          FROM s
+          JOIN v2_people pe ON lower(pe.email) = lower(s.person_email)
+     LEFT JOIN v2_projects p ON p.code = s.project_code
+         WHERE NOT EXISTS (
+                 SELECT 1 FROM v2_time_entries t
+                  WHERE t.source = 'import' AND t.person_id = pe.id
+                    AND t.work_date = s.work_date::date AND t.hours = s.hours::numeric(5,2)
+                    AND t.project_id IS NOT DISTINCT FROM p.id AND t.notes IS NOT DISTINCT FROM s.notes)
+         ORDER BY s.n;
+    """,
+)
+
+# Project codes are only unique per client, so `client` (name) may be needed
+# to pick one; `s_project` resolves each staged row to 0, 1 or more projects.
+LEGACY_PROJECTS = """
+    s_project AS (
+        SELECT s.n, min(p.id) AS project_id, count(p.id) AS matches
+          FROM s
+     LEFT JOIN projects p ON p.code = s.project_code
+     LEFT JOIN clients c  ON c.id = p.client_id
+         WHERE s.client IS NULL OR c.name = s.client
+         GROUP BY s.n
+    )
+"""
+
+LEGACY = Target(
+    required=("user_email", "project_code", "work_date", "hours"),
+    optional=("client", "task", "billable", "notes", "state"),
+    checks="""
+        WITH """ + LEGACY_PROJECTS + """
+        SELECT s.n, 'missing ' || c FROM s,
+               LATERAL (VALUES ('user_email', s.user_email), ('project_code', s.project_code),
+                               ('work_date', s.work_date), ('hours', s.hours)) v(c, val)
+         WHERE v.val IS NULL
+        UNION ALL
+        SELECT n, 'bad work_date ' || quote_literal(work_date) FROM s
+         WHERE work_date IS NOT NULL AND NOT pg_input_is_valid(work_date, 'date')
+        UNION ALL
+        SELECT n, 'bad hours ' || quote_literal(hours) FROM s
+         WHERE hours IS NOT NULL
+           AND CASE WHEN pg_input_is_valid(hours, 'numeric(5,2)') THEN hours::numeric < 0 ELSE TRUE END
+        UNION ALL
+        SELECT n, 'bad billable ' || quote_literal(billable) FROM s
+         WHERE billable IS NOT NULL AND NOT pg_input_is_valid(billable, 'boolean')
+        UNION ALL
+        SELECT n, 'bad state ' || quote_literal(state) FROM s
+         WHERE state NOT IN ('draft', 'submitted', 'approved', 'rejected')
+        UNION ALL
+        SELECT s.n, 'unknown user ' || quote_literal(s.user_email) FROM s
+     LEFT JOIN users u ON lower(u.email) = lower(s.user_email)
+         WHERE s.user_email IS NOT NULL AND u.id IS NULL
+        UNION ALL
+        SELECT s.n, CASE WHEN sp.matches > 1 THEN 'ambiguous project ' ELSE 'unknown project ' END
+                      || quote_literal(s.project_code) || COALESCE(' for client ' || quote_literal(s.client), '')
+          FROM s LEFT JOIN s_project sp ON sp.n = s.n
+         WHERE s.project_code IS NOT NULL AND COALESCE(sp.matches, 0) <> 1
+        UNION ALL
+        SELECT s.n, 'unknown task ' || quote_literal(s.task) FROM s
+          JOIN s_project sp ON sp.n = s.n AND sp.matches = 1
+     LEFT JOIN tasks t ON t.project_id = sp.project_id AND t.name = s.task
+         WHERE s.task IS NOT NULL AND t.id IS NULL
+    """,
+    merge="""
+        WITH """ + LEGACY_PROJECTS + """
+        INSERT INTO time_entries (user_id, project_id, task_id, work_date, hours, billable, notes, state, source)
+        SELECT u.id, sp.project_id, t.id, s.work_date::date, s.hours::numeric(5,2),
+               COALESCE(s.billable::boolean, t.billable_default, TRUE), s.notes,
+               COALESCE(s.state, 'draft'), 'import'
+          FROM s
+          JOIN users u       ON lower(u.email) = lower(s.user_email)
+          JOIN s_project sp  ON sp.n = s.n
+     LEFT JOIN tasks t       ON t.project_id = sp.project_id AND t.name = s.task
+         WHERE NOT EXISTS (
+                 SELECT 1 FROM time_entries e
+                  WHERE e.source = 'import' AND e.user_id = u.id AND e.project_id = sp.project_id
+                    AND e.work_date = s.work_date::date AND e.hours = s.hours::numeric(5,2)
+                    AND e.task_id IS NOT DISTINCT FROM t.id AND e.notes IS NOT DISTINCT FROM s.notes)
+         ORDER BY s.n;
+    """,
+)
+
+TARGETS: Dict[str, Target] = {"v2": V2, "legacy": LEGACY}
+
+class ImportRejected(Exception):
+    """The file failed validation; `errors` holds (csv line, message) pairs."""
+
+    def __init__(self, errors: List[Tuple[int, str]]) -> None:
+        super().__init__(f"{len(errors)} problem(s), first: line {errors[0][0]}: {errors[0][1]}")
+        self.errors = errors
+
+# "COPY s, line 3, column hours: ..." -> 3 (the header is line 1 of the file, not of the COPY)
+COPY_LINE = re.compile(r"\bline (\d+)")
+
+def copy_error(e: psycopg.errors.DataError) -> Tuple[int, str]:
+    """(csv line, message) for a row COPY itself refused."""
+    m = COPY_LINE.search(e.diag.context or "")
+    return (int(m.group(1)) + 1 if m else 0), e.diag.message_primary or str(e)
+
+def parse_header(line: bytes, target: Target) -> List[str]:
+    try:
+        text = line.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportRejected([(1, "header is not UTF-8")]) from None
+    columns = [c.strip().strip('"').lower() for c in text.strip().split(",")]
+    if "" in columns:
+        raise ImportRejected([(1, "empty column name in header")])
+    if len(set(columns)) != len(columns):
+        raise ImportRejected([(1, "duplicate column in header")])
+    missing = [c for c in target.required if c not in columns]
+    if missing:
+        raise ImportRejected([(1, f"missing column(s): {', '.join(missing)}")])
+    return columns
+
+async def import_csv(conn, chunks: AsyncIterator[bytes], target_name: str = "v2") -> Dict[str, int]:
+    """Stage, validate and merge one CSV; returns {"rows", "inserted", "skipped"}.
+
+    Commits on success; raises ImportRejected (nothing written) otherwise.
+    """
+    target = TARGETS[target_name]
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        if b"\n" in buf:
+            break
+    header, _, rest = buf.partition(b"\n")
+    columns = parse_header(header, target)
+
+    staged = columns + [c for c in target.optional if c not in columns]
+    async with conn.cursor() as cur:
+        # `n` follows COPY order, i.e. the data row number in the file.
+        await cur.execute(sql.SQL("""
+            CREATE TEMP TABLE s (n BIGINT GENERATED ALWAYS AS IDENTITY, {cols}) ON COMMIT DROP;
+        """).format(cols=sql.SQL(", ").join(sql.SQL("{} TEXT").format(sql.Identifier(c)) for c in staged)))
+        copy_sql = sql.SQL("COPY s ({cols}) FROM STDIN WITH (FORMAT csv)").format(
+            cols=sql.SQL(", ").join(map(sql.Identifier, columns)))
+        # wrong column counts, bad quoting and non-UTF-8 bytes fail the COPY
+        # itself (BadCopyFileFormat, CharacterNotInRepertoire: both DataError)
+        try:
+            async with cur.copy(copy_sql) as copy:
+                if rest:
+                    await copy.write(rest)
+                async for chunk in chunks:
+                    await copy.write(chunk)
+        except psycopg.errors.DataError as e:
+            await conn.rollback()
+            raise ImportRejected([copy_error(e)]) from None
+        rows = cur.rowcount
+        # CSV gives '' for empty quoted fields; treat them like missing ones
+        await cur.execute(sql.SQL("UPDATE s SET {} ;").format(sql.SQL(", ").join(
+            sql.SQL("{c} = NULLIF(trim({c}), '')").format(c=sql.Identifier(c)) for c in staged)))
+
+        await cur.execute(sql.SQL("SELECT n + 1, msg FROM ({}) e(n, msg) ORDER BY 1, 2 LIMIT {};").format(
+            sql.SQL(target.checks), sql.Literal(MAX_REPORTED_ERRORS)))
+        errors = await cur.fetchall()
+        if errors:
+            await conn.rollback()
+            raise ImportRejected([(int(line), msg) for line, msg in errors])
+
+        await cur.execute(target.merge)
+        inserted = cur.rowcount
+    await conn.commit()
+    return {"rows": rows, "inserted": inserted, "skipped": rows - inserted}
+
+@router.post("/import/time-entries")
+async def import_time_entries(file: UploadFile = File(...), target: str = Form("v2")) -> JSONResponse:
+    if target not in TARGETS:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"target must be one of {', '.join(TARGETS)}")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while data := await file.read(CHUNK_BYTES):
+            yield data
+
+    try:
+        async with connect() as conn:
+            result = await import_csv(conn, chunks(), target)
+    except ImportRejected as e:
+        return JSONResponse({"errors": [{"line": line, "error": msg} for line, msg in e.errors]},
+                            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return JSONResponse(result)
+
+# ---------- CLI ----------
+async def _main(args: argparse.Namespace) -> int:
+    async def chunks() -> AsyncIterator[bytes]:
+        with open(args.file, "rb") as f:
+            while data := f.read(CHUNK_BYTES):
+                yield data
+
+    async with await psycopg.AsyncConnection.connect(db_url(), **CONNECT_KWARGS) as conn:
+        try:
+            result = await import_csv(conn, chunks(), args.target)
+        except ImportRejected as e:
+            for line, msg in e.errors:
+                print(f"{args.file}:{line}: {msg}", file=sys.stderr)
+            print("import rejected, nothing written", file=sys.stderr)
+            return 1
+    print(f"{result['rows']} rows: {result['inserted']} inserted, {result['skipped']} already present")
+    return 0
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Import time entries from CSV.")
+    ap.add_argument("file")
+    ap.add_argument("--target", choices=sorted(TARGETS), default="v2")
+    sys.exit(asyncio.run(_main(ap.parse_args())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# app/instrument.py
+"""Per-request database and template timing.
+
+Pooled connections get cursor classes that count queries, rows and time
+into the stats of the request being served (a contextvar set by
+TimingMiddleware). Each response carries them in a Server-Timing header:
+
+    Server-Timing: db;dur=4.21, dbq;desc="3", rows;desc="57", render;dur=1.80, app;dur=7.02
+
+Streamed pages send headers before the body is rendered, so there the
+header covers only the work done up to the first byte; the totals kept for
+/diag and /metrics always cover the whole response.
+
+Queries slower than SLOW_QUERY_MS are printed to stderr with the route and
+the SQL with literals stripped. Prometheus metrics are served at /metrics
+when `prometheus_client` is installed.
+"""
+import re
+import sys
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from psycopg import AsyncCursor, AsyncServerCursor
+from psycopg.sql import Composable
+
+from app.db import env_float
+
+try:
+    import prometheus_client as prom
+except ImportError:  # metrics endpoint is optional
+    prom = None
+
+SLOW_QUERY_MS = env_float("SLOW_QUERY_MS", 200.0)
+
+# Distinct statements remembered for /diag; new ones past this are not tracked.
+MAX_TRACKED_STATEMENTS = 200
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_seconds", "rows", "render_seconds")
+
+    def __init__(self, scope: Optional[dict] = None) -> None:
+        self.scope = scope or {}
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.render_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """'GET /my-week'; the router fills scope["route"] once it has matched."""
+        route = getattr(self.scope.get("route"), "path", None) or "unmatched"
+        return f"{self.scope.get('method', '-')} {route}"
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+# ---------- in-process totals (for /diag) ----------
+class Totals:
+    __slots__ = ("requests", "queries", "db_seconds", "rows", "render_seconds", "seconds", "max_seconds")
+
+    def __init__(self) -> None:
+        self.requests = self.queries = self.rows = 0
+        self.db_seconds = self.render_seconds = self.seconds = self.max_seconds = 0.0
+
+route_totals: Dict[str, Totals] = {}
+# normalized SQL -> [calls, seconds, max seconds]
+statement_totals: Dict[str, list] = {}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+_normalized: Dict[str, str] = {}
+
+def normalize_sql(query, context) -> str:
+    """One-line SQL with string and number literals replaced by '?'."""
+    if isinstance(query, str):
+        text = _normalized.get(query)
+        if text is None:
+            text = _SPACE.sub(" ", _LITERALS.sub("?", query)).strip()
+            if len(_normalized) < MAX_TRACKED_STATEMENTS * 4:
+                _normalized[query] = text
+        return text
+    if isinstance(query, Composable):
+        query = query.as_string(context)
+    elif isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    return _SPACE.sub(" ", _LITERALS.sub("?", query)).strip()
+
+def _record_query(cur, query, seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+    text = normalize_sql(query, cur)
+    entry = statement_totals.get(text)
+    if entry is None and len(statement_totals) < MAX_TRACKED_STATEMENTS:
+        entry = statement_totals[text] = [0, 0.0, 0.0]
+    if entry is not None:
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats else "-"
+        print(f"SLOW QUERY {seconds * 1000:.1f}ms route={route} sql={text}", file=sys.stderr)
+        if prom:
+            SLOW_QUERIES.labels(route).inc()
+
+def _record_rows(n: int) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += n
+
+def record_render(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.render_seconds += seconds
+
+# ---------- psycopg hooks ----------
+class InstrumentedCursor(AsyncCursor):
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            _record_query(self, query, time.perf_counter() - started)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            _record_query(self, query, time.perf_counter() - started)
+
+    async def fetchone(self):
+        row = await super().fetchone()
+        _record_rows(row is not None)
+        return row
+
+    async def fetchmany(self, size: int = 0):
+        rows = await super().fetchmany(size)
+        _record_rows(len(rows))
+        return rows
+
+    async def fetchall(self):
+        rows = await super().fetchall()
+        _record_rows(len(rows))
+        return rows
+
+class InstrumentedServerCursor(AsyncServerCursor):
+    """Named cursors also spend database time in each fetch."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            _record_query(self, query, time.perf_counter() - started)
+
+    async def fetchmany(self, size: int = 0):
+        started = time.perf_counter()
+        rows = await super().fetchmany(size)
+        stats = _current.get()
+        if stats is not None:
+            stats.db_seconds += time.perf_counter() - started
+        _record_rows(len(rows))
+        return rows
+
+async def configure(conn) -> None:
+    """Pool `configure` callback: instrument every pooled connection."""
+    conn.cursor_factory = InstrumentedCursor
+    conn.server_cursor_factory = InstrumentedServerCursor
+
+# ---------- Prometheus ----------
+if prom:
+    REQUEST_SECONDS = prom.Histogram("app_request_seconds", "Request latency", ["route"])
+    REQUEST_QUERIES = prom.Histogram("app_request_db_queries", "Database queries per request", ["route"],
+                                     buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+    DB_SECONDS = prom.Counter("app_db_seconds", "Time spent in database calls", ["route"])
+    DB_ROWS = prom.Counter("app_db_rows", "Rows fetched from the database", ["route"])
+    RENDER_SECONDS = prom.Counter("app_render_seconds", "Time spent rendering templates", ["route"])
+    SLOW_QUERIES = prom.Counter("app_slow_queries", "Queries slower than SLOW_QUERY_MS", ["route"])
+
+# ---------- middleware ----------
+def server_timing(stats: RequestStats, elapsed: float) -> str:
+    return (f'db;dur={stats.db_seconds * 1000:.2f}, dbq;desc="{stats.queries}", rows;desc="{stats.rows}", '
+            f'render;dur={stats.render_seconds * 1000:.2f}, app;dur={elapsed * 1000:.2f}')
+
+class TimingMiddleware:
+    """Pure ASGI, so the contextvar is visible to streaming bodies too."""
+
+    # long-lived event streams would swamp the per-route averages
+    SKIP = ("/static/", "/metrics", "/approvals/events")
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.SKIP):
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def timed_send(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing",
+                                server_timing(stats, time.perf_counter() - started).encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await send(message)
+                _finish(stats, time.perf_counter() - started)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+
+def _finish(stats: RequestStats, elapsed: float) -> None:
+    route = stats.route
+    totals = route_totals.get(route)
+    if totals is None:
+        totals = route_totals[route] = Totals()
+    totals.requests += 1
+    totals.queries += stats.queries
+    totals.db_seconds += stats.db_seconds
+    totals.rows += stats.rows
+    totals.render_seconds += stats.render_seconds
+    totals.seconds += elapsed
+    totals.max_seconds = max(totals.max_seconds, elapsed)
+    if prom:
+        REQUEST_SECONDS.labels(route).observe(elapsed)
+        REQUEST_QUERIES.labels(route).observe(stats.queries)
+        DB_SECONDS.labels(route).inc(stats.db_seconds)
+        DB_ROWS.labels(route).inc(stats.rows)
+        RENDER_SECONDS.labels(route).inc(stats.render_seconds)
@@ -0,0 +1,61 @@
+# app/live.py
+"""Live approvals queue: NOTIFY -> this worker -> browsers (Server-Sent Events).
+
+Status changes in app.queries announce the entry ids they moved on
+APPROVALS_CHANNEL. Each worker holds one LISTEN connection (db.listen_forever,
+shared with the reference-data cache) whose handler publishes the payload to
+every open /approvals/events stream in that worker, so a thousand open
+approvals pages cost one database connection per worker, not one each.
+
+A subscriber that falls MAX_QUEUED events behind, or any subscriber after the
+listener reconnects (notifications sent meanwhile are lost), gets a
+{"status": "resync"} event and reloads instead.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Set
+
+from app.db import env_bool, env_float
+
+APPROVALS_LIVE = env_bool("APPROVALS_LIVE", True)
+KEEPALIVE_SECONDS = env_float("SSE_KEEPALIVE_SECONDS", 25.0)
+MAX_QUEUED = 100
+
+RESYNC = json.dumps({"status": "resync", "ids": None})
+
+class Hub:
+    def __init__(self) -> None:
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.published = 0
+
+    def publish(self, payload: str) -> None:
+        self.published += 1
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # too far behind to patch the page; start over from a reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def resync(self) -> None:
+        self.publish(RESYNC)
+
+    async def events(self) -> AsyncIterator[str]:
+        """One subscriber's SSE stream; runs until the client goes away."""
+        queue: asyncio.Queue = asyncio.Queue(MAX_QUEUED)
+        self.subscribers.add(queue)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            self.subscribers.discard(queue)
+
+hub = Hub()
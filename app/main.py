@@ -1,100 +1,121 @@
 # app/main.py
+import asyncio
+import hashlib
 import os
-import sys
+import re
+import secrets
+import time
 import traceback
-from datetime import date, timedelta
+from contextlib import aclosing, asynccontextmanager
+from datetime import date, timezone
+from email.utils import format_datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import RedirectResponse, HTMLResponse, PlainTextResponse, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Form
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from starlette import status
+from jinja2 import FileSystemBytecodeCache
 from jinja2.exceptions import TemplateNotFound
+from markupsafe import Markup, escape
+from pydantic import BaseModel, Field, ValidationError
 
-import psycopg
+from psycopg import errors, sql
 from psycopg.rows import dict_row
 
-# ---------- DB helpers ----------
-def db_url() -> str:
-    url = os.getenv("DATABASE_URL")
-    if not url:
-        print("ERROR: DATABASE_URL not set", file=sys.stderr)
-        raise RuntimeError("DATABASE_URL not set")
-    return url
-
-def connect():
-    # Force search_path to public so we always see the expected schema/tables
-    conn = psycopg.connect(db_url())
-    with conn.cursor() as cur:
-        cur.execute("SET search_path TO public;")
-    return conn
-
-def iso_week_dates(year: int, week: int) -> List[date]:
-    monday = date.fromisocalendar(year, week, 1)
-    return [monday + timedelta(days=i) for i in range(7)]
-
-def pick_default_person_id(conn) -> int:
-    with conn.cursor() as cur:
-        cur.execute("SELECT id FROM v2_people ORDER BY id LIMIT 1;")
-        row = cur.fetchone()
-        if not row:
-            raise RuntimeError("No v2_people in DB")
-        return int(row[0])
-
-def ensure_v2_schema() -> None:
-    """Create isolated v2 tables (no touching old tables) + seed minimal data."""
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS v2_people (
-                  id BIGSERIAL PRIMARY KEY,
-                  name TEXT NOT NULL,
-                  email TEXT UNIQUE,
-                  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-                );
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS v2_projects (
-                  id BIGSERIAL PRIMARY KEY,
-                  code TEXT UNIQUE,
-                  name TEXT NOT NULL,
-                  is_active BOOLEAN NOT NULL DEFAULT TRUE,
-                  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-                );
-            """)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS v2_time_entries (
-                  id BIGSERIAL PRIMARY KEY,
-                  person_id BIGINT NOT NULL REFERENCES v2_people(id) ON DELETE CASCADE,
-                  project_id BIGINT REFERENCES v2_projects(id) ON DELETE SET NULL,
-                  work_date DATE NOT NULL,
-                  hours NUMERIC(5,2) NOT NULL CHECK (hours >= 0),
-                  notes TEXT,
-                  status TEXT NOT NULL DEFAULT 'draft', -- draft|submitted|approved
-                  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
-                );
-            """)
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS v2_time_entries_person_date
-                ON v2_time_entries(person_id, work_date);
-            """)
-            conn.commit()
-
-            # seed default data if empty
-            cur.execute("SELECT COUNT(*) FROM v2_projects;")
-            if cur.fetchone()[0] == 0:
-                cur.execute("INSERT INTO v2_projects(code, name, is_active) VALUES (%s,%s,TRUE);",
-                            ("INT", "Internal"))
-            cur.execute("SELECT COUNT(*) FROM v2_people;")
-            if cur.fetchone()[0] == 0:
-                cur.execute("INSERT INTO v2_people(name, email) VALUES (%s,%s);",
-                            ("Ada Lovelace", "ada@example.com"))
-            conn.commit()
+from app import api, export, idempotency, importer, instrument, live, migrations, queries, reports, scheduler
+from app.db import close_pool, connect, env_bool, get_pool, listen_forever, open_pool
+from app.queries import iso_week_dates, week_status
+
+# ---------- reference-data cache ----------
+REF_CHANNEL = "v2_ref_data"
+REF_CACHE_NOTIFY = env_bool("REF_CACHE_NOTIFY", False)
+
+class RefCache:
+    """People and active projects for /my-week, kept until a write invalidates them.
+
+    Every invalidation bumps `version`; a fill computed against an older
+    version is dropped so a read racing a write can't cache stale lists.
+    (`epoch`, `version`) names the lists this process renders, for ETags.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = secrets.token_hex(8)
+        self.version = 0
+        self.people: Optional[List[dict]] = None
+        self.projects: Optional[List[dict]] = None
+        # HTML rendered from the cached lists, dropped along with them
+        self.fragments: Dict[str, Markup] = {}
+
+    @property
+    def warm(self) -> bool:
+        return self.people is not None and self.projects is not None
+
+    def fill(self, version: int, people: List[dict], projects: List[dict]) -> None:
+        if version == self.version:
+            self.people, self.projects = people, projects
+
+    def invalidate(self, _payload: str = "") -> None:
+        self.version += 1
+        self.people = self.projects = None
+        self.fragments = {}
+
+ref_cache = RefCache()
+
+async def load_ref_data(conn) -> Tuple[List[dict], List[dict]]:
+    """(people, active projects) from ref_cache, loading them on a miss."""
+    if ref_cache.warm:
+        return ref_cache.people, ref_cache.projects
+    version = ref_cache.version
+    people, projects = await queries.fetch_ref_data(conn)
+    ref_cache.fill(version, people, projects)
+    return people, projects
+
+async def commit_ref_change(conn) -> None:
+    """Commit a write to v2_people/v2_projects and drop cached reference data
+    here and (with REF_CACHE_NOTIFY) in every other worker."""
+    if REF_CACHE_NOTIFY:
+        await conn.execute(sql.SQL("NOTIFY {};").format(sql.Identifier(REF_CHANNEL)))
+    await conn.commit()
+    ref_cache.invalidate()
 
 # ---------- app + templates ----------
-app = FastAPI(title="Time Entry Demo (v2)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await open_pool(configure=instrument.configure)
+    if env_bool("MIGRATE_ON_STARTUP", True):
+        async with connect() as conn:
+            await migrations.migrate(conn)
+    background = []
+    # one LISTEN connection per worker for everything pushed by NOTIFY
+    handlers, on_connect = {}, []
+    if REF_CACHE_NOTIFY:
+        handlers[REF_CHANNEL] = ref_cache.invalidate
+        on_connect.append(ref_cache.invalidate)
+    if live.APPROVALS_LIVE:
+        handlers[queries.APPROVALS_CHANNEL] = live.hub.publish
+        on_connect.append(live.hub.resync)
+
+    def resync() -> None:
+        for callback in on_connect:
+            callback()
+
+    if handlers:
+        background.append(asyncio.create_task(listen_forever(handlers, on_connect=resync)))
+    if env_bool("ROLLUP_SCHEDULER", False):
+        background.append(asyncio.create_task(scheduler.run_forever()))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await close_pool()
+
+app = FastAPI(title="Time Entry Demo (v2)", lifespan=lifespan)
+app.add_middleware(instrument.TimingMiddleware)
 # Paths: app root (this file's folder) and repository root
 APP_ROOT = Path(__file__).resolve().parent
 REPO_ROOT = APP_ROOT.parent
@@ -103,15 +124,180 @@ REPO_ROOT = APP_ROOT.parent
 TEMPLATES_DIR = APP_ROOT / "templates"
 STATIC_DIR = REPO_ROOT / "static"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
-
-ensure_v2_schema()
-
-def render_or_fallback(tpl: str, ctx: dict, fallback_html: str) -> Response:
+# Compiled templates persist across restarts, so a fresh worker skips the
+# parse/compile step; JINJA_CACHE_DIR="" turns it off.
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", str(REPO_ROOT / ".jinja_cache"))
+if JINJA_CACHE_DIR:
+    Path(JINJA_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+# Async twin of templates.env for streamed pages. Async templates compile to
+# different code, hence the separate cache (in-memory and on disk).
+stream_env = templates.env.overlay(
+    enable_async=True,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR, "__jinja2_async_%s.cache") if JINJA_CACHE_DIR else None,
+)
+STREAM_CHUNK_CHARS = 16 * 1024
+
+# ---------- HTTP caching ----------
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles that also answers `name.<hash>.ext` for `name.ext`.
+
+    Templates link assets through static_url(), which embeds a digest of the
+    file's content; such URLs can never change meaning, so they are served
+    as immutable for a year. Plain URLs keep the default revalidation.
+    """
+
+    FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$")
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._digests: Dict[str, Tuple[int, str]] = {}
+
+    def digest(self, path: str) -> str:
+        """Content digest of `path`, recomputed only when its mtime changes."""
+        full = Path(self.directory) / path
+        mtime = full.stat().st_mtime_ns
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, hashlib.blake2b(full.read_bytes(), digest_size=6).hexdigest())
+            self._digests[path] = cached
+        return cached[1]
+
+    def url(self, path: str) -> str:
+        stem, dot, ext = path.rpartition(".")
+        return f"/static/{stem}.{self.digest(path)}.{ext}" if dot else f"/static/{path}"
+
+    async def get_response(self, path: str, scope) -> Response:
+        m = self.FINGERPRINTED.match(path)
+        if not m:
+            return await super().get_response(path, scope)
+        real = m["stem"] + m["ext"]
+        response = await super().get_response(real, scope)
+        if response.status_code in (200, 304) and self.digest(real) == m["digest"]:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+static_files = FingerprintedStaticFiles(directory=str(STATIC_DIR))
+templates.env.globals["static_url"] = static_files.url   # shared with stream_env
+
+def _tree_digest(*dirs: Path) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    for d in dirs:
+        for f in sorted(d.rglob("*")):
+            if f.is_file():
+                h.update(f"{f.relative_to(d)}:{f.stat().st_size}:{f.stat().st_mtime_ns}".encode())
+    return h.hexdigest()
+
+# Part of every page ETag, so a deploy that changes templates or assets
+# doesn't answer 304 for a page rendered by the old ones.
+RENDER_VERSION = _tree_digest(TEMPLATES_DIR, STATIC_DIR)
+
+def conditional(request: Request, version: dict) -> Tuple[dict, Optional[Response]]:
+    """Validator headers for a page whose data is summarized by `version`
+    (queries.change_versions() or the page's own read), plus a ready 304 if
+    the client's copy matches.
+
+    Only If-None-Match is honoured: change counters and row counts notice
+    deletes, a Last-Modified date alone would not.
+    """
+    digest = hashlib.blake2b(repr((RENDER_VERSION, str(request.url), sorted(version.items()))).encode(),
+                             digest_size=12).hexdigest()
+    etag = f'W/"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    changed = [v for k, v in version.items() if k.endswith("_at") and v is not None]
+    if changed:
+        headers["Last-Modified"] = format_datetime(max(changed).astimezone(timezone.utc), usegmt=True)
+    tags = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return headers, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return headers, None
+
+app.mount("/static", static_files, name="static")
+app.include_router(api.router)
+app.include_router(export.router)
+app.include_router(importer.router)
+app.include_router(reports.router)
+
+def render_or_fallback(tpl: str, ctx: dict, fallback_html: str, headers: Optional[dict] = None) -> Response:
+    started = time.perf_counter()
     try:
-        return templates.TemplateResponse(tpl, ctx)
+        return templates.TemplateResponse(tpl, ctx, headers=headers)
     except TemplateNotFound:
         return HTMLResponse(fallback_html)
+    finally:
+        instrument.record_render(time.perf_counter() - started)
+
+def stream_template(tpl: str, ctx: dict, load: Callable[..., Awaitable[dict]], fallback_html: str,
+                    headers: Optional[dict] = None) -> Response:
+    """Render `tpl` while its rows are still being read from the database.
+
+    `load(conn)` runs once the response starts, on a pooled connection held
+    until the last byte, and returns the rest of the context (row streams
+    from app.queries). Output goes out in STREAM_CHUNK_CHARS pieces, so the
+    first byte doesn't wait for the last row and memory doesn't grow with it.
+    """
+    try:
+        template = stream_env.get_template(tpl)
+    except TemplateNotFound:
+        return HTMLResponse(fallback_html)
+
+    async def body() -> AsyncIterator[str]:
+        stats = instrument.current()
+        async with connect() as conn:
+            page = dict(ctx, **await load(conn))
+            # render time = time inside the template minus the row fetches it awaited
+            db_before = stats.db_seconds if stats else 0.0
+            inside, started = 0.0, time.perf_counter()
+            try:
+                async with aclosing(template.generate_async(page)) as pieces:
+                    buf, size = [], 0
+                    async for piece in pieces:
+                        buf.append(piece)
+                        size += len(piece)
+                        if size >= STREAM_CHUNK_CHARS:
+                            inside += time.perf_counter() - started
+                            yield "".join(buf)
+                            started = time.perf_counter()
+                            buf, size = [], 0
+                    inside += time.perf_counter() - started
+                    if stats:
+                        instrument.record_render(max(inside - (stats.db_seconds - db_before), 0.0))
+                    yield "".join(buf)
+            finally:
+                # streams the template never finished (or never reached)
+                for value in page.values():
+                    if isinstance(value, queries.RowStream):
+                        await value.aclose()
+
+    return StreamingResponse(body(), media_type="text/html; charset=utf-8", headers=headers)
+
+def project_options(projects: List[dict]) -> Markup:
+    """<option>s for the project picker; rendered once per ref_cache version."""
+    cacheable = projects is ref_cache.projects
+    html = ref_cache.fragments.get("project_options") if cacheable else None
+    if html is None:
+        html = Markup(templates.get_template("_project_options.html").render(projects=projects))
+        if cacheable:
+            ref_cache.fragments["project_options"] = html
+    return html
+
+FILL_WEEK_CACHED = 8   # weeks; most requests are for the current one
+
+def fill_week_rows(projects: List[dict], days: List[date]) -> Markup:
+    """Project x day inputs of the "Fill week" form; rendered once per
+    ref_cache version and week, like project_options()."""
+    cacheable = projects is ref_cache.projects
+    name = f"fill_week:{days[0].isoformat()}"
+    html = ref_cache.fragments.get(name) if cacheable else None
+    if html is None:
+        html = Markup(templates.get_template("_fill_week.html").render(projects=projects, days=days))
+        if cacheable:
+            weeks = [k for k in ref_cache.fragments if k.startswith("fill_week:")]
+            for old in weeks[:max(0, len(weeks) - FILL_WEEK_CACHED + 1)]:
+                del ref_cache.fragments[old]
+            ref_cache.fragments[name] = html
+    return html
 
 def html_error(msg: str, err: Exception) -> HTMLResponse:
     tb = traceback.format_exc()
@@ -126,49 +312,161 @@ def html_error(msg: str, err: Exception) -> HTMLResponse:
     return HTMLResponse(body, status_code=500)
 
 # ---------- diag route ----------
+def render_hot_paths(top: int = 15) -> str:
+    """Per-route averages and the costliest statements since this worker started."""
+    routes = sorted(instrument.route_totals.items(), key=lambda kv: kv[1].seconds, reverse=True)
+    route_rows = "".join(
+        f"<tr><td><code>{escape(name)}</code></td><td>{t.requests}</td>"
+        f"<td>{t.seconds / t.requests * 1000:.1f}</td><td>{t.max_seconds * 1000:.1f}</td>"
+        f"<td>{t.queries / t.requests:.1f}</td><td>{t.db_seconds / t.requests * 1000:.1f}</td>"
+        f"<td>{t.rows / t.requests:.0f}</td><td>{t.render_seconds / t.requests * 1000:.1f}</td></tr>"
+        for name, t in routes
+    )
+    stmts = sorted(instrument.statement_totals.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+    stmt_rows = "".join(
+        f"<tr><td>{calls}</td><td>{secs * 1000:.1f}</td><td>{secs / calls * 1000:.2f}</td>"
+        f"<td>{worst * 1000:.1f}</td><td><code>{escape(text[:300])}</code></td></tr>"
+        for text, (calls, secs, worst) in stmts
+    )
+    return f"""
+          <p>slow-query log threshold: {instrument.SLOW_QUERY_MS:g} ms</p>
+          <table border="1" cellpadding="4" style="border-collapse:collapse">
+            <tr><th>route</th><th>requests</th><th>avg ms</th><th>max ms</th><th>queries/req</th>
+                <th>db ms/req</th><th>rows/req</th><th>render ms/req</th></tr>
+            {route_rows}
+          </table>
+          <h3>Top statements by total time</h3>
+          <table border="1" cellpadding="4" style="border-collapse:collapse">
+            <tr><th>calls</th><th>total ms</th><th>avg ms</th><th>max ms</th><th>sql</th></tr>
+            {stmt_rows}
+          </table>"""
+
+DIAG_TABLES = ["v2_people", "v2_projects", "v2_time_entries",
+               "weekly_summary", "project_month_summary", "rollup_dirty", "v2_idempotency_keys"]
+
+# Planner statistics instead of COUNT(*): reltuples is -1 until the first
+# ANALYZE, when n_live_tup (the stats collector's running count) stands in.
+DIAG_TABLES_SQL = """
+    SELECT c.relname AS name,
+           CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint ELSE s.n_live_tup END AS estimate,
+           s.n_live_tup AS live, s.n_dead_tup AS dead,
+           pg_total_relation_size(c.oid) AS bytes,
+           s.seq_scan, COALESCE(s.idx_scan, 0) AS idx_scan,
+           s.n_mod_since_analyze AS modified,
+           greatest(s.last_vacuum, s.last_autovacuum) AS vacuumed_at,
+           greatest(s.last_analyze, s.last_autoanalyze) AS analyzed_at
+      FROM pg_class c
+      JOIN pg_stat_user_tables s ON s.relid = c.oid
+     WHERE c.relnamespace = current_schema()::regnamespace AND c.relname = ANY(%s)
+  ORDER BY array_position(%s, c.relname::text);
+"""
+
+DIAG_INDEXES_SQL = """
+    SELECT s.relname AS table_name, s.indexrelname AS name, s.idx_scan, s.idx_tup_read,
+           pg_relation_size(s.indexrelid) AS bytes
+      FROM pg_stat_user_indexes s
+     WHERE s.schemaname = current_schema() AND s.relname = ANY(%s)
+  ORDER BY s.relname, s.idx_scan DESC, s.indexrelname;
+"""
+
+DIAG_COLUMNS_SQL = """
+    SELECT c.relname AS table_name, a.attname AS name,
+           format_type(a.atttypid, a.atttypmod) AS type, NOT a.attnotnull AS nullable
+      FROM pg_attribute a
+      JOIN pg_class c ON c.oid = a.attrelid
+     WHERE c.relnamespace = current_schema()::regnamespace AND c.relname = ANY(%s)
+       AND a.attnum > 0 AND NOT a.attisdropped
+  ORDER BY c.relname, a.attnum;
+"""
+
+# Column lists only change with a migration: (schema version, {table: columns}).
+_diag_columns: Optional[Tuple[int, Dict[str, List[dict]]]] = None
+
+async def diag_columns(conn, exact: bool) -> Dict[str, List[dict]]:
+    global _diag_columns
+    version = await migrations.current_version(conn)
+    if exact or _diag_columns is None or _diag_columns[0] != version:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(DIAG_COLUMNS_SQL, (DIAG_TABLES,))
+            columns: Dict[str, List[dict]] = {}
+            for row in await cur.fetchall():
+                columns.setdefault(row["table_name"], []).append(row)
+        _diag_columns = (version, columns)
+    return _diag_columns[1]
+
+def _size(n: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
 @app.get("/diag", response_class=HTMLResponse)
-async def diag() -> Response:
+async def diag(exact: bool = False) -> Response:
+    """Catalog statistics only, so it is safe to poll; ?exact=1 adds real
+    COUNT(*)s (a full scan of each table) and re-reads the column lists."""
     try:
-        with connect() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute("SELECT current_schema() AS schema, now() AS now;")
-                meta = cur.fetchone()
-
-                def table_info(name: str):
-                    cur.execute("""
-                        SELECT column_name, data_type, is_nullable
-                        FROM information_schema.columns
-                        WHERE table_schema=current_schema() AND table_name=%s
-                        ORDER BY ordinal_position;
-                    """, (name,))
-                    cols = cur.fetchall()
-                    cur.execute(f"SELECT COUNT(*) AS c FROM {name};")
-                    cnt = cur.fetchone()["c"]
-                    return cols, cnt
-
-                vp_cols, vp_cnt = table_info("v2_people")
-                vpr_cols, vpr_cnt = table_info("v2_projects")
-                vt_cols, vt_cnt = table_info("v2_time_entries")
+        async with connect() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute("SELECT current_schema() AS schema, now() AS now;")
+                meta = await cur.fetchone()
+                await cur.execute(DIAG_TABLES_SQL, (DIAG_TABLES, DIAG_TABLES))
+                tables = await cur.fetchall()
+                await cur.execute(DIAG_INDEXES_SQL, (DIAG_TABLES,))
+                indexes = await cur.fetchall()
+                if exact:
+                    for t in tables:
+                        await cur.execute(sql.SQL("SELECT count(*) AS c FROM {};").format(sql.Identifier(t["name"])))
+                        t["exact"] = (await cur.fetchone())["c"]
+            await conn.commit()
+            columns = await diag_columns(conn, exact)
 
         def render_cols(cols):
             return "".join(
-                f"<li><code>{c['column_name']}</code> — {c['data_type']} — nullable: {c['is_nullable']}</li>"
+                f"<li><code>{c['name']}</code> — {c['type']} — nullable: {'YES' if c['nullable'] else 'NO'}</li>"
                 for c in cols
             )
 
+        def render_table(t):
+            rows = f"exact: {t['exact']}" if "exact" in t else f"~{t['estimate']} (estimate)"
+            total = t["live"] + t["dead"]
+            dead_pct = f"{t['dead'] / total:.0%}" if total else "-"
+            return f"""
+          <h2>{t['name']} (rows: {rows})</h2>
+          <p>{_size(t['bytes'])} with indexes · dead tuples: {t['dead']} ({dead_pct}) ·
+             seq scans: {t['seq_scan']} · index scans: {t['idx_scan']} ·
+             modified since analyze: {t['modified']} · vacuumed: {t['vacuumed_at'] or 'never'} ·
+             analyzed: {t['analyzed_at'] or 'never'}</p>
+          <ul>{render_cols(columns.get(t['name'], []))}</ul>"""
+
+        index_rows = "".join(
+            f"<tr><td>{i['table_name']}</td><td><code>{i['name']}</code></td><td>{i['idx_scan']}</td>"
+            f"<td>{i['idx_tup_read']}</td><td>{_size(i['bytes'])}</td></tr>"
+            for i in indexes
+        )
+        pool_stats = get_pool().get_stats()
+
         html = f"""
         <html><body style="font-family:system-ui;max-width:900px;margin:2rem auto">
           <h1>Diagnostics</h1>
-          <p><b>schema:</b> {meta['schema']} &nbsp; <b>now:</b> {meta['now']}</p>
+          <p><b>schema:</b> {meta['schema']} &nbsp; <b>now:</b> {meta['now']} &nbsp;
+             {'<a href="/diag">estimates</a>' if exact else '<a href="/diag?exact=1">exact counts</a>'}</p>
+          {"".join(render_table(t) for t in tables)}
 
-          <h2>v2_people (rows: {vp_cnt})</h2>
-          <ul>{render_cols(vp_cols)}</ul>
+          <h2>Index usage</h2>
+          <table border="1" cellpadding="4" style="border-collapse:collapse">
+            <tr><th>table</th><th>index</th><th>scans</th><th>tuples read</th><th>size</th></tr>
+            {index_rows}
+          </table>
 
-          <h2>v2_projects (rows: {vpr_cnt})</h2>
-          <ul>{render_cols(vpr_cols)}</ul>
+          <h2>Connection pool (this worker)</h2>
+          <ul>{"".join(f"<li><code>{k}</code> — {v}</li>" for k, v in pool_stats.items())}</ul>
 
-          <h2>v2_time_entries (rows: {vt_cnt})</h2>
-          <ul>{render_cols(vt_cols)}</ul>
+          <h2>Hot paths (this worker)</h2>
+          {render_hot_paths()}
+
+          <h2>Rollup scheduler (this worker)</h2>
+          <ul>{"".join(f"<li><code>{k}</code> — {v}</li>" for k, v in scheduler.stats.as_dict().items())}</ul>
         </body></html>
         """
         return HTMLResponse(html)
@@ -180,6 +478,12 @@ async def diag() -> Response:
 async def healthz() -> PlainTextResponse:
     return PlainTextResponse("ok")
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    if instrument.prom is None:
+        return PlainTextResponse("prometheus_client is not installed", status_code=status.HTTP_501_NOT_IMPLEMENTED)
+    return Response(instrument.prom.generate_latest(), media_type=instrument.prom.CONTENT_TYPE_LATEST)
+
 @app.get("/")
 async def root_redirect() -> RedirectResponse:
     y, w, _ = date.today().isocalendar()
@@ -188,52 +492,53 @@ async def root_redirect() -> RedirectResponse:
 # My Week — time entry grid
 @app.get("/my-week", response_class=HTMLResponse)
 async def my_week(request: Request, year: Optional[int] = None, week: Optional[int] = None, person_id: Optional[int] = None) -> Response:
+    if not year or not week:
+        y, w, _ = date.today().isocalendar()
+        year, week = year or y, week or w
     try:
-        today = date.today()
-        if not year or not week:
-            y, w, _ = today.isocalendar()
-            year, week = year or y, week or w
-
-        with connect() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute("SELECT id, name FROM v2_people ORDER BY name;")
-                people = cur.fetchall()
-            if not person_id:
-                person_id = pick_default_person_id(conn)
-
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute("SELECT id, code, name FROM v2_projects WHERE is_active IS TRUE ORDER BY name;")
-                projects = cur.fetchall()
-
-            days = iso_week_dates(year, week)
-            start, end = days[0], days[-1]
-
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute("""
-                    SELECT te.id, te.work_date, te.hours, te.notes, te.status,
-                           p.id AS project_id, p.name AS project_name, p.code AS project_code
-                      FROM v2_time_entries te
-                 LEFT JOIN v2_projects p ON p.id = te.project_id
-                     WHERE te.person_id = %s AND te.work_date BETWEEN %s AND %s
-                  ORDER BY te.work_date, te.id;
-                """, (person_id, start, end))
-                rows = cur.fetchall()
-
-            by_day: Dict[date, List[dict]] = {d: [] for d in days}
-            total = 0.0
-            for r in rows:
-                by_day[r["work_date"]].append(r)
-                total += float(r["hours"] or 0)
-
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT
-                      COALESCE(BOOL_AND(status='approved'), FALSE) AS all_approved,
-                      COALESCE(BOOL_OR(status='submitted'), FALSE) AS any_submitted
-                    FROM v2_time_entries
-                    WHERE person_id=%s AND work_date BETWEEN %s AND %s;
-                """, (person_id, start, end))
-                all_approved, any_submitted = cur.fetchone()
+        days = iso_week_dates(year, week)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    start, end = days[0], days[-1]
+
+    try:
+        # one snapshot of the cache: another request may fill or drop it
+        # while this one awaits the database
+        cache_version = ref_cache.version
+        people, projects = ref_cache.people, ref_cache.projects
+        warm = people is not None and projects is not None
+        if warm and not person_id:
+            person_id = min((p["id"] for p in people), default=None)
+            if person_id is None:
+                raise RuntimeError("No v2_people in DB")
+
+        async with connect() as conn:
+            if warm:
+                page = await queries.fetch_week(conn, person_id, start, end)
+            else:
+                page = await queries.fetch_week_page(conn, person_id, start, end)
+                if page["person_id"] is None:
+                    raise RuntimeError("No v2_people in DB")
+                person_id, people, projects = page["person_id"], page["people"], page["projects"]
+                ref_cache.fill(cache_version, people, projects)
+        entries = page["entries"]
+
+        # the ETag comes from the same read: no version query per hit, and the
+        # people/project lists are named by the cache version they belong to
+        headers, not_modified = conditional(request, {
+            "year": year, "week": week, "person_id": person_id,
+            "entries": page["entries_count"], "entries_at": page["entries_at"],
+            "ref": (ref_cache.epoch, cache_version),
+        })
+        if not_modified:
+            return not_modified
+
+        by_day: Dict[date, List[dict]] = {d: [] for d in days}
+        total = 0.0
+        for r in entries:
+            r["work_date"] = date.fromisoformat(r["work_date"])
+            by_day[r["work_date"]].append(r)
+            total += float(r["hours"] or 0)
 
         ctx = {
             "request": request,
@@ -244,164 +549,416 @@ async def my_week(request: Request, year: Optional[int] = None, week: Optional[i
             "people": people,
             "person_id": person_id,
             "projects": projects,
+            "project_options": project_options(projects),
+            "fill_week_rows": fill_week_rows(projects, days),
             "total_hours": total,
-            "status_hint": "approved" if all_approved else ("submitted" if any_submitted else "draft"),
+            "status_hint": week_status(entries),
         }
-        return render_or_fallback("my_week.html", ctx, "<h1>My Week</h1><p>templates/my_week.html missing.</p>")
+        return render_or_fallback("my_week.html", ctx, "<h1>My Week</h1><p>templates/my_week.html missing.</p>",
+                                  headers)
 
     except Exception as e:
         return html_error("While rendering /my-week", e)
 
+def partial(request: Request) -> Optional[str]:
+    """"json" or "html" when a script wants only the changed piece of the page
+    (Accept: application/json, or an X-Partial header), None for plain forms."""
+    if request.headers.get("accept", "").startswith("application/json"):
+        return "json"
+    return "html" if request.headers.get("x-partial") else None
+
+def week_redirect(person_id: int, year: int, week: int) -> RedirectResponse:
+    return RedirectResponse(f"/my-week?year={year}&week={week}&person_id={person_id}", status_code=status.HTTP_303_SEE_OTHER)
+
+def entry_response(request: Request, row: Optional[dict], person_id: int, year: int, week: int) -> Response:
+    """After an add or edit: the entry's week-grid row (or JSON) for scripts,
+    a redirect to the whole week for plain form posts."""
+    kind = partial(request)
+    if kind is None:
+        return week_redirect(person_id, year, week)
+    if row is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "no such draft entry")
+    if kind == "json":
+        return JSONResponse(jsonable_encoder(row))
+    ctx = {"request": request, "r": row, "person_id": person_id, "year": year, "week": week}
+    return render_or_fallback("_entry_row.html", ctx, "")
+
+# hours is numeric(5,2)
+MAX_HOURS = 999.99
+
+def unknown_reference(e: errors.ForeignKeyViolation) -> HTTPException:
+    """422 for a person or project id that doesn't exist."""
+    return HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, e.diag.message_detail or str(e))
+
 @app.post("/time/add")
 async def time_add(
+    request: Request,
     person_id: int = Form(...),
-    work_date: str = Form(...),
+    work_date: date = Form(...),
     project_id: Optional[int] = Form(None),
-    hours: float = Form(...),
+    hours: float = Form(..., ge=0, le=MAX_HOURS),
     notes: Optional[str] = Form(None),
     year: int = Form(...),
     week: int = Form(...)
-) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO v2_time_entries (person_id, project_id, work_date, hours, notes, status)
-                VALUES (%s, %s, %s, %s, %s, 'draft');
-            """, (person_id, project_id, work_date, hours, notes))
-            conn.commit()
-    return RedirectResponse(f"/my-week?year={year}&week={week}&person_id={person_id}", status_code=status.HTTP_303_SEE_OTHER)
+) -> Response:
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        try:
+            row = await queries.add_entry(conn, person_id, project_id, work_date, hours, notes)
+        except errors.ForeignKeyViolation as e:
+            raise unknown_reference(e)
+        response = await claim.save(conn, entry_response(request, row, person_id, year, week))
+        await conn.commit()
+    return response
+
+@app.post("/time/edit/{entry_id}")
+async def time_edit(
+    request: Request,
+    entry_id: int,
+    person_id: int = Form(...),
+    hours: float = Form(..., ge=0, le=MAX_HOURS),
+    notes: Optional[str] = Form(None),
+    year: int = Form(...),
+    week: int = Form(...)
+) -> Response:
+    """Change a draft entry's hours and notes in place."""
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        row = await queries.edit_entry(conn, entry_id, hours, notes or None)
+        response = await claim.save(conn, entry_response(request, row, person_id, year, week))
+        await conn.commit()
+    return response
+
+class BulkEntry(BaseModel):
+    work_date: date
+    project_id: Optional[int] = None
+    hours: float = Field(ge=0, le=MAX_HOURS)
+    notes: Optional[str] = None
+
+class BulkWeek(BaseModel):
+    person_id: int
+    year: int
+    week: int
+    entries: List[BulkEntry]
+
+def parse_bulk_form(form) -> BulkWeek:
+    """Week-grid form: one `h:<project_id>:<YYYY-MM-DD>` hours field per cell,
+    optional `n:<project_id>:<YYYY-MM-DD>` notes. Blank or zero cells are skipped."""
+    entries = []
+    for key, value in form.multi_items():
+        if not key.startswith("h:") or not str(value).strip() or float(value) == 0:
+            continue
+        _, project_id, work_date = key.split(":", 2)
+        entries.append({
+            "work_date": work_date,
+            "project_id": int(project_id) if project_id else None,
+            "hours": value,
+            "notes": form.get(f"n:{project_id}:{work_date}") or None,
+        })
+    return BulkWeek(person_id=form.get("person_id"), year=form.get("year"),
+                    week=form.get("week"), entries=entries)
+
+@app.post("/time/bulk")
+async def time_bulk(request: Request) -> Response:
+    """Insert a whole week of entries (JSON body or week-grid form) in one transaction."""
+    is_json = request.headers.get("content-type", "").startswith("application/json")
+    try:
+        if is_json:
+            payload = BulkWeek.model_validate_json(await request.body())
+        else:
+            payload = parse_bulk_form(await request.form())
+        days = iso_week_dates(payload.year, payload.week)
+    except ValidationError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    start, end = days[0], days[-1]
+    outside = sorted({e.work_date.isoformat() for e in payload.entries if not start <= e.work_date <= end})
+    if outside:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            f"dates outside ISO week {payload.year}-W{payload.week:02d}: {', '.join(outside)}")
+
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        async with conn.cursor() as cur:
+            await queries.lock_week(cur, payload.person_id, start)
+            try:
+                await cur.executemany(queries.INSERT_ENTRY_SQL,
+                                      [(payload.person_id, e.project_id, e.work_date, e.hours, e.notes)
+                                       for e in payload.entries])
+            except errors.ForeignKeyViolation as e:
+                raise unknown_reference(e)
+        if is_json:
+            entries = await queries.fetch_entries(conn, payload.person_id, start, end)
+            response = JSONResponse({
+                "person_id": payload.person_id,
+                "year": payload.year,
+                "week": payload.week,
+                "inserted": len(payload.entries),
+                "total_hours": sum(float(e["hours"] or 0) for e in entries),
+                "status": week_status(entries),
+                "entries": entries,
+            })
+        else:
+            response = week_redirect(payload.person_id, payload.year, payload.week)
+        await claim.save(conn, response)
+        await conn.commit()
+    return response
 
 @app.post("/time/delete/{entry_id}")
-async def time_delete(entry_id: int, person_id: int = Form(...), year: int = Form(...), week: int = Form(...)) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM v2_time_entries WHERE id=%s;", (entry_id,))
-            conn.commit()
-    return RedirectResponse(f"/my-week?year={year}&week={week}&person_id={person_id}", status_code=status.HTTP_303_SEE_OTHER)
+async def time_delete(request: Request, entry_id: int, person_id: int = Form(...), year: int = Form(...),
+                      week: int = Form(...)) -> Response:
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        row = await queries.delete_entry(conn, entry_id)
+        kind = partial(request)
+        if kind is None:
+            response = week_redirect(person_id, year, week)
+        elif row is None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "no such entry")
+        elif kind == "json":
+            response = JSONResponse(jsonable_encoder(row))
+        else:
+            response = Response(status_code=status.HTTP_204_NO_CONTENT)
+        await claim.save(conn, response)
+        await conn.commit()
+    return response
 
 @app.post("/time/submit-week")
-async def time_submit_week(person_id: int = Form(...), year: int = Form(...), week: int = Form(...)) -> RedirectResponse:
+async def time_submit_week(request: Request, person_id: int = Form(...), year: int = Form(...),
+                           week: int = Form(...)) -> Response:
+    """Submit the week's drafts under the week lock; JSON callers get the count."""
     start, end = iso_week_dates(year, week)[0], iso_week_dates(year, week)[-1]
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                UPDATE v2_time_entries
-                   SET status='submitted'
-                 WHERE person_id=%s AND work_date BETWEEN %s AND %s AND status='draft';
-            """, (person_id, start, end))
-            conn.commit()
-    return RedirectResponse(f"/my-week?year={year}&week={week}&person_id={person_id}", status_code=status.HTTP_303_SEE_OTHER)
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        submitted = await queries.submit_week(conn, person_id, start, end)
+        if partial(request) == "json":
+            response = JSONResponse({"person_id": person_id, "year": year, "week": week, "submitted": submitted})
+        else:
+            response = week_redirect(person_id, year, week)
+        await claim.save(conn, response)
+        await conn.commit()
+    return response
 
 # Approvals
+def opt_int(raw: Optional[str]) -> Optional[int]:
+    return int(raw) if raw not in (None, "") else None
+
+def opt_date(raw: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(raw) if raw not in (None, "") else None
+
+def relative_url(url) -> str:
+    return f"{url.path}?{url.query}" if url.query else url.path
+
 @app.get("/approvals", response_class=HTMLResponse)
-async def approvals(request: Request) -> Response:
-    with connect() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("""
-                SELECT te.id, te.person_id, pe.name AS person_name, te.work_date, te.hours, te.notes, te.status,
-                       p.code AS project_code, p.name AS project_name
-                  FROM v2_time_entries te
-             LEFT JOIN v2_people pe   ON pe.id = te.person_id
-             LEFT JOIN v2_projects p  ON p.id = te.project_id
-                 WHERE te.status='submitted'
-              ORDER BY te.person_id, te.work_date, te.id;
-            """)
-            rows = cur.fetchall()
-    ctx = {"request": request, "rows": rows}
-    return render_or_fallback("approvals.html", ctx, "<h1>Approvals</h1><p>templates/approvals.html missing.</p>")
+async def approvals(
+    request: Request,
+    person_id: Optional[str] = None,
+    project_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    after: Optional[str] = None,
+    limit: int = queries.APPROVALS_PAGE_SIZE,
+) -> Response:
+    # Filter form selects submit "" for "all", so parse by hand.
+    try:
+        filters = queries.ApprovalFilter(opt_int(person_id), opt_int(project_id),
+                                         opt_date(date_from), opt_date(date_to))
+        if after:
+            queries.decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    async with connect() as conn:
+        version = await queries.change_versions(conn, "people", "projects", "approvals")
+    headers, not_modified = conditional(request, version)
+    if not_modified:
+        return not_modified
+
+    async def load(conn) -> dict:
+        people, projects = await load_ref_data(conn)
+        return {"people": people, "projects": projects,
+                "rows": queries.SubmittedRows(conn, filters, after, limit)}
+
+    ctx = {
+        "request": request,
+        "filters": filters,
+        "here": relative_url(request.url),
+        "live": live.APPROVALS_LIVE,
+        # live updates add rows only to the first page; later pages just drop them
+        "live_rows_url": relative_url(request.url.replace(path="/approvals/rows").remove_query_params(
+            ["after", "limit"])) if live.APPROVALS_LIVE and not after else None,
+        # the next-page cursor is only known after the rows have streamed
+        "page_url": lambda cursor: relative_url(request.url.include_query_params(after=cursor)),
+        "first_url": relative_url(request.url.remove_query_params("after")) if after else None,
+    }
+    return stream_template("approvals.html", ctx, load, "<h1>Approvals</h1><p>templates/approvals.html missing.</p>",
+                           headers)
+
+@app.get("/approvals/events")
+async def approvals_events() -> StreamingResponse:
+    """Server-Sent Events: {"status", "ids"} for every change to the queue."""
+    if not live.APPROVALS_LIVE:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "live updates are off (APPROVALS_LIVE=0)")
+    return StreamingResponse(live.hub.events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/approvals/rows", response_class=HTMLResponse)
+async def approvals_rows(
+    request: Request,
+    ids: List[int] = Query([]),
+    person_id: Optional[str] = None,
+    project_id: Optional[str] = None,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+) -> Response:
+    """Table rows for just these entries (those still submitted and matching
+    the page's filters), for the approvals page to splice in."""
+    try:
+        filters = queries.ApprovalFilter(opt_int(person_id), opt_int(project_id),
+                                         opt_date(date_from), opt_date(date_to))
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    async with connect() as conn:
+        rows = await queries.submitted_by_id(conn, filters, ids)
+    page = request.url.replace(path="/approvals").remove_query_params("ids")
+    return render_or_fallback("_approval_rows.html", {"request": request, "rows": rows, "here": relative_url(page)},
+                              "")
+
+async def decide_entry(request: Request, entry_id: int, new_status: str) -> Response:
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        await queries.set_entry_status(conn, entry_id, new_status)
+        response = await claim.save(conn, RedirectResponse("/approvals", status_code=status.HTTP_303_SEE_OTHER))
+        await conn.commit()
+    return response
 
 @app.post("/approvals/approve/{entry_id}")
-async def approvals_approve(entry_id: int) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE v2_time_entries SET status='approved' WHERE id=%s;", (entry_id,))
-            conn.commit()
-    return RedirectResponse("/approvals", status_code=status.HTTP_303_SEE_OTHER)
+async def approvals_approve(request: Request, entry_id: int) -> Response:
+    return await decide_entry(request, entry_id, "approved")
 
 @app.post("/approvals/reject/{entry_id}")
-async def approvals_reject(entry_id: int) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE v2_time_entries SET status='draft' WHERE id=%s;", (entry_id,))
-            conn.commit()
-    return RedirectResponse("/approvals", status_code=status.HTTP_303_SEE_OTHER)
+async def approvals_reject(request: Request, entry_id: int) -> Response:
+    return await decide_entry(request, entry_id, "draft")
+
+@app.post("/approvals/batch")
+async def approvals_batch(
+    request: Request,
+    action: str = Form(...),
+    ids: List[int] = Form([]),
+    person_id: Optional[int] = Form(None),
+    year: Optional[int] = Form(None),
+    week: Optional[int] = Form(None),
+    back: str = Form("/approvals"),
+) -> Response:
+    """Approve or reject the checked entries, or a person's whole week, in one UPDATE."""
+    new_status = queries.DECISIONS.get(action)
+    if new_status is None:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"unknown action {action!r}")
+    # back to the same filtered page, but never off-site
+    if not back.startswith("/approvals"):
+        back = "/approvals"
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        if person_id is not None and year and week:
+            try:
+                days = iso_week_dates(year, week)
+            except ValueError as e:
+                raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+            await queries.set_week_status(conn, person_id, days[0], days[-1], new_status)
+        elif ids:
+            await queries.set_status_many(conn, ids, new_status)
+        response = await claim.save(conn, RedirectResponse(back, status_code=status.HTTP_303_SEE_OTHER))
+        await conn.commit()
+    return response
 
 # People
 @app.get("/people", response_class=HTMLResponse)
 async def people_list(request: Request) -> Response:
-    with connect() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("SELECT id, name, email, created_at FROM v2_people ORDER BY name;")
-            rows = cur.fetchall()
-    ctx = {"request": request, "rows": rows}
-    return render_or_fallback("people.html", ctx, "<h1>People</h1><p>templates/people.html missing.</p>")
+    async with connect() as conn:
+        version = await queries.change_versions(conn, "people")
+    headers, not_modified = conditional(request, version)
+    if not_modified:
+        return not_modified
+
+    async def load(conn) -> dict:
+        return {"rows": queries.stream_people(conn)}
+    return stream_template("people.html", {"request": request}, load,
+                           "<h1>People</h1><p>templates/people.html missing.</p>", headers)
+
+async def ref_write(request: Request, query: str, params: tuple, back: str) -> Response:
+    """One write to v2_people/v2_projects from a form post, then back to the list."""
+    async with connect() as conn:
+        claim = await idempotency.claim(conn, request)
+        if claim.replay:
+            return claim.replay
+        async with conn.cursor() as cur:
+            await cur.execute(query, params)
+        response = await claim.save(conn, RedirectResponse(back, status_code=status.HTTP_303_SEE_OTHER))
+        await commit_ref_change(conn)
+    return response
 
 @app.post("/people/add")
-async def people_add(name: str = Form(...), email: Optional[str] = Form(None)) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO v2_people(name, email)
-                VALUES (%s, %s)
-                ON CONFLICT (email) DO UPDATE SET name=EXCLUDED.name;
-            """, (name.strip(), email))
-            conn.commit()
-    return RedirectResponse("/people", status_code=status.HTTP_303_SEE_OTHER)
+async def people_add(request: Request, name: str = Form(...), email: Optional[str] = Form(None)) -> Response:
+    return await ref_write(request, """
+        INSERT INTO v2_people(name, email)
+        VALUES (%s, %s)
+        ON CONFLICT (email) DO UPDATE SET name=EXCLUDED.name;
+    """, (name.strip(), email), "/people")
 
 @app.post("/people/delete/{person_id}")
-async def people_delete(person_id: int) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM v2_people WHERE id=%s;", (person_id,))
-            conn.commit()
-    return RedirectResponse("/people", status_code=status.HTTP_303_SEE_OTHER)
+async def people_delete(request: Request, person_id: int) -> Response:
+    return await ref_write(request, queries.DELETE_PERSON_SQL, (person_id, person_id), "/people")
 
 # Projects
 @app.get("/projects", response_class=HTMLResponse)
 async def projects_list(request: Request) -> Response:
-    with connect() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("SELECT id, code, name, is_active FROM v2_projects ORDER BY is_active DESC, name;")
-            rows = cur.fetchall()
-    ctx = {"request": request, "rows": rows}
-    return render_or_fallback("projects.html", ctx, "<h1>Projects</h1><p>templates/projects.html missing.</p>")
+    async with connect() as conn:
+        version = await queries.change_versions(conn, "projects")
+    headers, not_modified = conditional(request, version)
+    if not_modified:
+        return not_modified
 
-@app.post("/projects/add")
-async def projects_add(code: Optional[str] = Form(None), name: str = Form(...)) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO v2_projects(code, name, is_active)
-                VALUES (NULLIF(%s,''), %s, TRUE)
-                ON CONFLICT (code) DO UPDATE SET name=EXCLUDED.name, is_active=TRUE;
-            """, (code, name.strip()))
-            conn.commit()
-    return RedirectResponse("/projects", status_code=status.HTTP_303_SEE_OTHER)
+    async def load(conn) -> dict:
+        return {"rows": queries.stream_projects(conn)}
+    return stream_template("projects.html", {"request": request}, load,
+                           "<h1>Projects</h1><p>templates/projects.html missing.</p>", headers)
 
+@app.post("/projects/add")
+async def projects_add(request: Request, code: Optional[str] = Form(None), name: str = Form(...)) -> Response:
+    return await ref_write(request, """
+        INSERT INTO v2_projects(code, name, is_active)
+        VALUES (NULLIF(%s,''), %s, TRUE)
+        ON CONFLICT (code) DO UPDATE SET name=EXCLUDED.name, is_active=TRUE;
+    """, (code, name.strip()), "/projects")
+
+# toggling twice is not a no-op, so this one most needs the form's key
 @app.post("/projects/toggle/{project_id}")
-async def projects_toggle(project_id: int) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE v2_projects SET is_active = NOT is_active WHERE id=%s;", (project_id,))
-            conn.commit()
-    return RedirectResponse("/projects", status_code=status.HTTP_303_SEE_OTHER)
+async def projects_toggle(request: Request, project_id: int) -> Response:
+    return await ref_write(request, "UPDATE v2_projects SET is_active = NOT is_active WHERE id=%s;", (project_id,),
+                           "/projects")
 
 @app.post("/projects/delete/{project_id}")
-async def projects_delete(project_id: int) -> RedirectResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM v2_projects WHERE id=%s;", (project_id,))
-            conn.commit()
-    return RedirectResponse("/projects", status_code=status.HTTP_303_SEE_OTHER)
+async def projects_delete(request: Request, project_id: int) -> Response:
+    return await ref_write(request, "DELETE FROM v2_projects WHERE id=%s;", (project_id,), "/projects")
 
 # Reset v2 schema only (doesn't touch old tables)
 @app.post("/v2/reset")
 async def v2_reset() -> PlainTextResponse:
-    with connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DROP TABLE IF EXISTS v2_time_entries CASCADE;")
-            cur.execute("DROP TABLE IF EXISTS v2_projects CASCADE;")
-            cur.execute("DROP TABLE IF EXISTS v2_people CASCADE;")
-            conn.commit()
-    ensure_v2_schema()
+    async with connect() as conn:
+        await migrations.reset_v2(conn)
+        await commit_ref_change(conn)
     return PlainTextResponse("v2 schema reset complete")
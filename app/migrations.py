@@ -0,0 +1,415 @@
+# app/migrations.py
+"""Versioned schema migrations for the isolated v2 tables.
+
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations --status   # print current / latest version
+
+Applied versions are recorded in `schema_version`. Workers only run the
+cheap `current_version()` check at startup; the DDL itself runs under a
+transaction-scoped advisory lock, so concurrent starters serialize and all
+but the first find nothing left to do.
+"""
+import argparse
+import asyncio
+from typing import List, Tuple
+
+import psycopg
+
+from app.db import CONNECT_KWARGS, db_url
+
+# Arbitrary but fixed key for pg_advisory_xact_lock().
+LOCK_KEY = 720_001
+
+# (version, name, sql) — append only; never edit an applied migration.
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "v2 base tables", """
+        CREATE TABLE IF NOT EXISTS v2_people (
+          id BIGSERIAL PRIMARY KEY,
+          name TEXT NOT NULL,
+          email TEXT UNIQUE,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS v2_projects (
+          id BIGSERIAL PRIMARY KEY,
+          code TEXT UNIQUE,
+          name TEXT NOT NULL,
+          is_active BOOLEAN NOT NULL DEFAULT TRUE,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE IF NOT EXISTS v2_time_entries (
+          id BIGSERIAL PRIMARY KEY,
+          person_id BIGINT NOT NULL REFERENCES v2_people(id) ON DELETE CASCADE,
+          project_id BIGINT REFERENCES v2_projects(id) ON DELETE SET NULL,
+          work_date DATE NOT NULL,
+          hours NUMERIC(5,2) NOT NULL CHECK (hours >= 0),
+          notes TEXT,
+          status TEXT NOT NULL DEFAULT 'draft', -- draft|submitted|approved
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS v2_time_entries_person_date
+        ON v2_time_entries(person_id, work_date);
+
+        -- seed default data if empty
+        INSERT INTO v2_projects(code, name, is_active)
+        SELECT 'INT', 'Internal', TRUE WHERE NOT EXISTS (SELECT 1 FROM v2_projects);
+        INSERT INTO v2_people(name, email)
+        SELECT 'Ada Lovelace', 'ada@example.com' WHERE NOT EXISTS (SELECT 1 FROM v2_people);
+    """),
+    (2, "partial index for the approvals queue", """
+        -- matches the keyset order of /approvals; project_id rides along for the filter
+        CREATE INDEX IF NOT EXISTS v2_time_entries_submitted
+        ON v2_time_entries(person_id, work_date, id) INCLUDE (project_id)
+        WHERE status = 'submitted';
+    """),
+    (3, "v2_time_entries.source", """
+        ALTER TABLE v2_time_entries
+          ADD COLUMN IF NOT EXISTS source TEXT NOT NULL DEFAULT 'manual'
+          CHECK (source IN ('manual','timer','import'));
+    """),
+    (4, "weekly_summary maintained by triggers", """
+        -- one row per person, ISO week and project (0 = no project); rows that
+        -- drop to zero entries are removed by the trigger
+        CREATE TABLE IF NOT EXISTS weekly_summary (
+          person_id BIGINT NOT NULL,
+          iso_year INT NOT NULL,
+          iso_week INT NOT NULL,
+          project_id BIGINT NOT NULL DEFAULT 0,
+          total_hours NUMERIC(12,2) NOT NULL DEFAULT 0,
+          entries INT NOT NULL DEFAULT 0,
+          draft_entries INT NOT NULL DEFAULT 0,
+          submitted_entries INT NOT NULL DEFAULT 0,
+          approved_entries INT NOT NULL DEFAULT 0,
+          PRIMARY KEY (person_id, iso_year, iso_week, project_id)
+        );
+        CREATE INDEX IF NOT EXISTS weekly_summary_week ON weekly_summary(iso_year, iso_week);
+
+        INSERT INTO weekly_summary
+        SELECT person_id, extract(isoyear FROM work_date)::int, extract(week FROM work_date)::int,
+               COALESCE(project_id, 0), sum(hours), count(*),
+               count(*) FILTER (WHERE status = 'draft'),
+               count(*) FILTER (WHERE status = 'submitted'),
+               count(*) FILTER (WHERE status = 'approved')
+          FROM v2_time_entries
+         GROUP BY 1, 2, 3, 4
+        ON CONFLICT DO NOTHING;
+
+        -- Statement-level: a bulk insert, import or batch approval folds its
+        -- rows into one upsert per touched (person, week, project).
+        CREATE OR REPLACE FUNCTION v2_weekly_summary_apply() RETURNS TRIGGER AS $$
+        DECLARE
+          src TEXT := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT *, 1 AS sign FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT *, -1 AS sign FROM old_rows'
+            ELSE 'SELECT *, 1 AS sign FROM new_rows UNION ALL SELECT *, -1 AS sign FROM old_rows'
+          END;
+          keys TEXT := 'person_id, extract(isoyear FROM work_date)::int, extract(week FROM work_date)::int, COALESCE(project_id, 0)';
+        BEGIN
+          EXECUTE format($q$
+            INSERT INTO weekly_summary AS ws
+            SELECT %s, sum(sign * hours), sum(sign),
+                   COALESCE(sum(sign) FILTER (WHERE status = 'draft'), 0),
+                   COALESCE(sum(sign) FILTER (WHERE status = 'submitted'), 0),
+                   COALESCE(sum(sign) FILTER (WHERE status = 'approved'), 0)
+              FROM (%s) d
+             GROUP BY 1, 2, 3, 4
+            ON CONFLICT (person_id, iso_year, iso_week, project_id) DO UPDATE SET
+              total_hours = ws.total_hours + EXCLUDED.total_hours,
+              entries = ws.entries + EXCLUDED.entries,
+              draft_entries = ws.draft_entries + EXCLUDED.draft_entries,
+              submitted_entries = ws.submitted_entries + EXCLUDED.submitted_entries,
+              approved_entries = ws.approved_entries + EXCLUDED.approved_entries
+          $q$, keys, src);
+          EXECUTE format($q$
+            DELETE FROM weekly_summary ws
+             USING (SELECT DISTINCT %s FROM (%s) d) k(person_id, iso_year, iso_week, project_id)
+             WHERE (ws.person_id, ws.iso_year, ws.iso_week, ws.project_id)
+                 = (k.person_id, k.iso_year, k.iso_week, k.project_id)
+               AND ws.entries = 0
+          $q$, keys, src);
+          RETURN NULL;
+        END; $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS v2_weekly_summary_ins ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_weekly_summary_upd ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_weekly_summary_del ON v2_time_entries;
+        CREATE TRIGGER v2_weekly_summary_ins AFTER INSERT ON v2_time_entries
+          REFERENCING NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_weekly_summary_apply();
+        CREATE TRIGGER v2_weekly_summary_upd AFTER UPDATE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_weekly_summary_apply();
+        CREATE TRIGGER v2_weekly_summary_del AFTER DELETE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_weekly_summary_apply();
+    """),
+    (5, "project_month_summary with dirty-bucket tracking", """
+        -- Rebuilt bucket by bucket by app/scheduler.py (distinct people can't
+        -- be maintained by deltas); entries without a project are not rolled up.
+        CREATE TABLE IF NOT EXISTS project_month_summary (
+          project_id BIGINT NOT NULL,
+          month DATE NOT NULL,
+          total_hours NUMERIC(12,2) NOT NULL,
+          approved_hours NUMERIC(12,2) NOT NULL,
+          entries INT NOT NULL,
+          people INT NOT NULL,
+          refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+          PRIMARY KEY (project_id, month)
+        );
+        -- (project, month) buckets written since their last rebuild; dirtied_at
+        -- keeps the first write so the scheduler can report lag
+        CREATE TABLE IF NOT EXISTS rollup_dirty (
+          project_id BIGINT NOT NULL,
+          month DATE NOT NULL,
+          dirtied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+          PRIMARY KEY (project_id, month)
+        );
+        CREATE INDEX IF NOT EXISTS v2_time_entries_project_date
+        ON v2_time_entries(project_id, work_date);
+
+        INSERT INTO project_month_summary (project_id, month, total_hours, approved_hours, entries, people)
+        SELECT project_id, date_trunc('month', work_date)::date, sum(hours),
+               COALESCE(sum(hours) FILTER (WHERE status = 'approved'), 0), count(*), count(DISTINCT person_id)
+          FROM v2_time_entries
+         WHERE project_id IS NOT NULL
+         GROUP BY 1, 2
+        ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION v2_rollup_mark_dirty() RETURNS TRIGGER AS $$
+        DECLARE
+          src TEXT := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT project_id, work_date FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT project_id, work_date FROM old_rows'
+            ELSE 'SELECT project_id, work_date FROM new_rows UNION SELECT project_id, work_date FROM old_rows'
+          END;
+        BEGIN
+          EXECUTE format($q$
+            INSERT INTO rollup_dirty (project_id, month)
+            SELECT DISTINCT project_id, date_trunc('month', work_date)::date
+              FROM (%s) d
+             WHERE project_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+          $q$, src);
+          RETURN NULL;
+        END; $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS v2_rollup_dirty_ins ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_rollup_dirty_upd ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_rollup_dirty_del ON v2_time_entries;
+        CREATE TRIGGER v2_rollup_dirty_ins AFTER INSERT ON v2_time_entries
+          REFERENCING NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_rollup_mark_dirty();
+        CREATE TRIGGER v2_rollup_dirty_upd AFTER UPDATE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_rollup_mark_dirty();
+        CREATE TRIGGER v2_rollup_dirty_del AFTER DELETE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_rollup_mark_dirty();
+    """),
+    (6, "updated_at on the v2 tables", """
+        -- page version tokens (ETags) are row count + max(updated_at)
+        CREATE OR REPLACE FUNCTION v2_touch_updated_at() RETURNS TRIGGER AS $$
+        BEGIN NEW.updated_at = now(); RETURN NEW; END; $$ LANGUAGE plpgsql;
+
+        ALTER TABLE v2_people ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+        ALTER TABLE v2_projects ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+        ALTER TABLE v2_time_entries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+        DROP TRIGGER IF EXISTS v2_people_touch_updated_at ON v2_people;
+        DROP TRIGGER IF EXISTS v2_projects_touch_updated_at ON v2_projects;
+        DROP TRIGGER IF EXISTS v2_time_entries_touch_updated_at ON v2_time_entries;
+        CREATE TRIGGER v2_people_touch_updated_at BEFORE UPDATE ON v2_people
+          FOR EACH ROW EXECUTE FUNCTION v2_touch_updated_at();
+        CREATE TRIGGER v2_projects_touch_updated_at BEFORE UPDATE ON v2_projects
+          FOR EACH ROW EXECUTE FUNCTION v2_touch_updated_at();
+        CREATE TRIGGER v2_time_entries_touch_updated_at BEFORE UPDATE ON v2_time_entries
+          FOR EACH ROW EXECUTE FUNCTION v2_touch_updated_at();
+    """),
+    (7, "idempotency keys and the per-week lock", """
+        -- responses of POST routes by client-chosen key (app/idempotency.py)
+        CREATE TABLE IF NOT EXISTS v2_idempotency_keys (
+          key TEXT PRIMARY KEY,
+          fingerprint TEXT NOT NULL,
+          status INT,
+          headers JSONB,
+          body BYTEA,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_v2_idempotency_keys_created_at ON v2_idempotency_keys(created_at);
+
+        -- Transaction lock on one person's ISO week. Submitting a week and
+        -- adding entries to it take it, so an add lands either before the
+        -- submission (and is submitted with it) or after (a visible draft).
+        -- Ids past 2^31 wrap; a collision only serializes two weeks.
+        CREATE OR REPLACE FUNCTION v2_lock_week(p_person_id BIGINT, p_day DATE) RETURNS void AS $$
+          SELECT pg_advisory_xact_lock((p_person_id % 2147483647)::int,
+                                       (extract(isoyear FROM p_day) * 100 + extract(week FROM p_day))::int);
+        $$ LANGUAGE sql;
+    """),
+    (8, "dirty markers locked until the writer commits", """
+        -- ON CONFLICT DO NOTHING leaves an existing marker unlocked, so a
+        -- claimer could delete it and rebuild the bucket from a snapshot
+        -- without this write. Key-share locks keep claimers (SKIP LOCKED) off
+        -- the markers and make a full rebuild's DELETE wait for the commit,
+        -- but don't block other writers to the same buckets. A marker deleted
+        -- between the insert and the lock is inserted again.
+        CREATE OR REPLACE FUNCTION v2_rollup_mark_dirty() RETURNS TRIGGER AS $$
+        DECLARE
+          src TEXT := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT project_id, work_date FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT project_id, work_date FROM old_rows'
+            ELSE 'SELECT project_id, work_date FROM new_rows UNION SELECT project_id, work_date FROM old_rows'
+          END;
+          buckets TEXT;
+          wanted BIGINT;
+          locked BIGINT;
+        BEGIN
+          buckets := format($q$
+            SELECT DISTINCT project_id, date_trunc('month', work_date)::date AS month
+              FROM (%s) d
+             WHERE project_id IS NOT NULL
+          $q$, src);
+          EXECUTE format('SELECT count(*) FROM (%s) b', buckets) INTO wanted;
+          LOOP
+            EXECUTE format('INSERT INTO rollup_dirty (project_id, month) %s ORDER BY 1, 2 ON CONFLICT DO NOTHING',
+                           buckets);
+            EXECUTE format($q$
+              SELECT count(*) FROM (
+                SELECT 1 FROM rollup_dirty r JOIN (%s) b USING (project_id, month)
+                 ORDER BY r.project_id, r.month
+                   FOR KEY SHARE OF r) l
+            $q$, buckets) INTO locked;
+            EXIT WHEN locked = wanted;
+          END LOOP;
+          RETURN NULL;
+        END; $$ LANGUAGE plpgsql;
+    """),
+    (9, "change counters for page versions", """
+        -- Page versions (ETags) read one row here instead of scanning what
+        -- the page shows. People and projects bump on every write statement;
+        -- entries bump 'approvals' only when a statement touches submitted
+        -- rows, so draft writes never wait on the counter row.
+        CREATE TABLE IF NOT EXISTS v2_change_counters (
+          name TEXT PRIMARY KEY,
+          version BIGINT NOT NULL DEFAULT 0,
+          changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        INSERT INTO v2_change_counters (name) VALUES ('people'), ('projects'), ('approvals')
+        ON CONFLICT DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION v2_bump_counter() RETURNS TRIGGER AS $$
+        BEGIN
+          UPDATE v2_change_counters SET version = version + 1, changed_at = now() WHERE name = TG_ARGV[0];
+          RETURN NULL;
+        END; $$ LANGUAGE plpgsql;
+
+        -- each transition table is only there for the events that have it
+        CREATE OR REPLACE FUNCTION v2_bump_approvals() RETURNS TRIGGER AS $$
+        DECLARE
+          touched BOOLEAN := FALSE;
+        BEGIN
+          IF TG_OP <> 'DELETE' THEN
+            touched := EXISTS (SELECT 1 FROM new_rows WHERE status = 'submitted');
+          END IF;
+          IF NOT touched AND TG_OP <> 'INSERT' THEN
+            touched := EXISTS (SELECT 1 FROM old_rows WHERE status = 'submitted');
+          END IF;
+          IF touched THEN
+            UPDATE v2_change_counters SET version = version + 1, changed_at = now() WHERE name = 'approvals';
+          END IF;
+          RETURN NULL;
+        END; $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS v2_people_bump_counter ON v2_people;
+        DROP TRIGGER IF EXISTS v2_projects_bump_counter ON v2_projects;
+        DROP TRIGGER IF EXISTS v2_approvals_bump_ins ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_approvals_bump_upd ON v2_time_entries;
+        DROP TRIGGER IF EXISTS v2_approvals_bump_del ON v2_time_entries;
+        CREATE TRIGGER v2_people_bump_counter AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON v2_people
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_bump_counter('people');
+        CREATE TRIGGER v2_projects_bump_counter AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON v2_projects
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_bump_counter('projects');
+        CREATE TRIGGER v2_approvals_bump_ins AFTER INSERT ON v2_time_entries
+          REFERENCING NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_bump_approvals();
+        CREATE TRIGGER v2_approvals_bump_upd AFTER UPDATE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_bump_approvals();
+        CREATE TRIGGER v2_approvals_bump_del AFTER DELETE ON v2_time_entries
+          REFERENCING OLD TABLE AS old_rows
+          FOR EACH STATEMENT EXECUTE FUNCTION v2_bump_approvals();
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+async def current_version(conn) -> int:
+    """Highest applied version, 0 if nothing was ever applied. One cheap query."""
+    try:
+        cur = await conn.execute("SELECT COALESCE(max(version), 0) FROM schema_version;")
+        version = (await cur.fetchone())[0]
+    except psycopg.errors.UndefinedTable:
+        version = 0
+    await conn.rollback()
+    return version
+
+async def migrate(conn) -> int:
+    """Apply pending migrations in one transaction; returns the resulting version."""
+    if await current_version(conn) >= LATEST_VERSION:
+        return LATEST_VERSION
+
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT pg_advisory_xact_lock(%s);", (LOCK_KEY,))
+        await cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+              version INT PRIMARY KEY,
+              name TEXT NOT NULL,
+              applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        # Re-read under the lock: another worker may have just finished.
+        await cur.execute("SELECT COALESCE(max(version), 0) FROM schema_version;")
+        version = (await cur.fetchone())[0]
+        for v, name, ddl in MIGRATIONS:
+            if v <= version:
+                continue
+            await cur.execute(ddl)
+            await cur.execute("INSERT INTO schema_version(version, name) VALUES (%s, %s);", (v, name))
+            version = v
+    await conn.commit()
+    return version
+
+async def reset_v2(conn) -> int:
+    """Drop the v2 tables and their migration history, then migrate from scratch."""
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT pg_advisory_xact_lock(%s);", (LOCK_KEY,))
+        await cur.execute("DROP TABLE IF EXISTS v2_time_entries CASCADE;")
+        await cur.execute("DROP TABLE IF EXISTS v2_projects CASCADE;")
+        await cur.execute("DROP TABLE IF EXISTS v2_people CASCADE;")
+        await cur.execute("DROP TABLE IF EXISTS weekly_summary;")
+        await cur.execute("DROP TABLE IF EXISTS project_month_summary;")
+        await cur.execute("DROP TABLE IF EXISTS rollup_dirty;")
+        await cur.execute("DROP TABLE IF EXISTS v2_idempotency_keys;")
+        await cur.execute("DROP TABLE IF EXISTS v2_change_counters;")
+        await cur.execute("DROP TABLE IF EXISTS schema_version;")
+    await conn.commit()
+    return await migrate(conn)
+
+async def _main(args: argparse.Namespace) -> None:
+    async with await psycopg.AsyncConnection.connect(db_url(), **CONNECT_KWARGS) as conn:
+        if args.status:
+            print(f"schema version {await current_version(conn)} (latest {LATEST_VERSION})")
+            return
+        before = await current_version(conn)
+        after = await migrate(conn)
+        if after == before:
+            print(f"already at version {after}")
+        else:
+            print(f"migrated {before} -> {after}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Apply v2 schema migrations.")
+    ap.add_argument("--status", action="store_true", help="print versions and exit")
+    asyncio.run(_main(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+# app/queries.py
+"""SQL shared by the HTML routes (app/main.py) and the JSON API (app/api.py).
+
+Helpers take an open connection and never commit; the caller owns the
+transaction.
+"""
+from collections import deque
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from psycopg import sql
+from psycopg.rows import dict_row
+
+def iso_week_dates(year: int, week: int) -> List[date]:
+    monday = date.fromisocalendar(year, week, 1)
+    return [monday + timedelta(days=i) for i in range(7)]
+
+def week_status(entries: List[dict]) -> str:
+    """approved | submitted | draft for a week's entries; an empty week is a draft."""
+    statuses = [e["status"] for e in entries]
+    if statuses and all(s == "approved" for s in statuses):
+        return "approved"
+    return "submitted" if "submitted" in statuses else "draft"
+
+# ---------- prepared statements ----------
+# Statements wrapped in hot() are prepared the first time a pooled connection
+# runs them and executed by name after that, so Postgres parses and plans
+# them once per connection. Anything else still gets psycopg's automatic
+# preparation after prepare_threshold (5) runs. DB_PREPARE=0 (app/db.py)
+# turns all of it off.
+HOT_STATEMENTS: Set[str] = set()
+
+def hot(query: str) -> str:
+    HOT_STATEMENTS.add(query)
+    return query
+
+async def execute(cur, query, params=None):
+    """cur.execute(), preparing registered hot statements on first use."""
+    return await cur.execute(query, params, prepare=True if query in HOT_STATEMENTS else None)
+
+# ---------- streaming ----------
+STREAM_FETCH_ROWS = 500
+
+class RowStream:
+    """Async iterator of dict rows from a server-side cursor, fetched
+    STREAM_FETCH_ROWS at a time, for rendering a page while it is read.
+
+    The cursor is closed once the rows run out; a consumer that stops early
+    (an aborted render) calls aclose(), as stream_template does.
+    """
+
+    def __init__(self, conn, query, params=(), name: str = "row_stream") -> None:
+        self._cur = conn.cursor(name=name, row_factory=dict_row)
+        self._query, self._params = query, params
+        self._rows: deque = deque()
+        self._started = self._exhausted = False
+
+    def __aiter__(self) -> "RowStream":
+        return self
+
+    async def __anext__(self) -> dict:
+        if not self._rows and not self._exhausted:
+            if not self._started:
+                self._started = True
+                await self._cur.execute(self._query, self._params)
+            batch = await self._cur.fetchmany(STREAM_FETCH_ROWS)
+            self._exhausted = len(batch) < STREAM_FETCH_ROWS
+            self._rows.extend(batch)
+        if not self._rows:
+            await self.aclose()
+            raise StopAsyncIteration
+        return self._rows.popleft()
+
+    async def aclose(self) -> None:
+        if not self._cur.closed:
+            await self._cur.close()
+
+# ---------- week entries ----------
+# A person's entries in a date range as one JSON array, with their count and
+# newest updated_at: /my-week's ETag comes from the same read as the page
+# (count catches deletes, updated_at inserts and edits).
+_ENTRIES_COLUMNS = """
+           COALESCE(json_agg(json_build_object(
+             'id', te.id, 'work_date', te.work_date, 'hours', te.hours, 'notes', te.notes,
+             'status', te.status, 'project_id', p.id, 'project_name', p.name, 'project_code', p.code
+           ) ORDER BY te.work_date, te.id), '[]'::json) AS entries,
+           count(te.id) AS entries_count, max(te.updated_at) AS entries_at
+      FROM v2_time_entries te
+ LEFT JOIN v2_projects p ON p.id = te.project_id"""
+
+# Everything /my-week needs in one round trip: the person defaults to the
+# lowest id, and each list comes back as a JSON array.
+MY_WEEK_SQL = hot(f"""
+    WITH target AS (
+        SELECT COALESCE(%(person_id)s::bigint, (SELECT min(id) FROM v2_people)) AS person_id
+    )
+    SELECT t.person_id,
+      (SELECT COALESCE(json_agg(json_build_object('id', id, 'name', name) ORDER BY name), '[]'::json)
+         FROM v2_people) AS people,
+      (SELECT COALESCE(json_agg(json_build_object('id', id, 'code', code, 'name', name) ORDER BY name), '[]'::json)
+         FROM v2_projects WHERE is_active IS TRUE) AS projects,
+      e.entries, e.entries_count, e.entries_at
+      FROM target t
+CROSS JOIN LATERAL (
+    SELECT {_ENTRIES_COLUMNS}
+     WHERE te.person_id = t.person_id AND te.work_date BETWEEN %(start)s AND %(end)s) e;
+""")
+
+# Same entries on their own, for when people/projects are already known.
+MY_WEEK_ENTRIES_SQL = hot(f"""
+    SELECT {_ENTRIES_COLUMNS}
+     WHERE te.person_id = %(person_id)s AND te.work_date BETWEEN %(start)s AND %(end)s;
+""")
+
+async def fetch_week_page(conn, person_id: Optional[int], start: date, end: date) -> dict:
+    """{person_id, people, projects, entries, entries_count, entries_at};
+    person_id is None if there are no people."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, MY_WEEK_SQL, {"person_id": person_id or None, "start": start, "end": end})
+        return await cur.fetchone()
+
+async def fetch_week(conn, person_id: int, start: date, end: date) -> dict:
+    """{entries, entries_count, entries_at} for a person's entries in [start, end]."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, MY_WEEK_ENTRIES_SQL, {"person_id": person_id, "start": start, "end": end})
+        return await cur.fetchone()
+
+async def fetch_entries(conn, person_id: int, start: date, end: date) -> List[dict]:
+    """A person's entries in [start, end], work_date as ISO strings."""
+    return (await fetch_week(conn, person_id, start, end))["entries"]
+
+INSERT_ENTRY_SQL = hot("""
+    INSERT INTO v2_time_entries (person_id, project_id, work_date, hours, notes, status)
+    VALUES (%s, %s, %s, %s, %s, 'draft');
+""")
+
+# ---------- single-entry edits ----------
+# The week grid patches itself from these: each is one statement whose
+# RETURNING row is everything the entry's row on the page shows.
+def _entry_row(change: str) -> str:
+    return hot(f"""
+        WITH e AS ({change} RETURNING id, work_date, hours, notes, status, project_id)
+        SELECT e.id, e.work_date, e.hours, e.notes, e.status, e.project_id,
+               p.name AS project_name, p.code AS project_code
+          FROM e LEFT JOIN v2_projects p ON p.id = e.project_id;
+    """)
+
+# Adds and submit_week serialize on the person's week (v2_lock_week, migration 7).
+LOCK_WEEK_SQL = hot("SELECT v2_lock_week(%s, %s);")
+
+async def lock_week(cur, person_id: int, day: date) -> None:
+    """Hold the lock on person_id's ISO week containing `day` until commit."""
+    await execute(cur, LOCK_WEEK_SQL, (person_id, day))
+
+# the lock rides along in the same statement: an INSERT reads nothing, so
+# taking it after the statement's snapshot is fine
+ADD_ENTRY_SQL = _entry_row("""
+    INSERT INTO v2_time_entries (person_id, project_id, work_date, hours, notes, status)
+    SELECT %(person_id)s, %(project_id)s, %(work_date)s, %(hours)s, %(notes)s, 'draft'
+      FROM v2_lock_week(%(person_id)s, %(work_date)s)""")
+
+# only drafts: submitted and approved hours change through the approvals queue
+EDIT_ENTRY_SQL = _entry_row("""
+    UPDATE v2_time_entries SET hours=%s, notes=%s WHERE id=%s AND status='draft'""")
+
+async def add_entry(conn, person_id: int, project_id: Optional[int], work_date: date,
+                    hours: float, notes: Optional[str]) -> dict:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, ADD_ENTRY_SQL, {"person_id": person_id, "project_id": project_id, "work_date": work_date,
+                                           "hours": hours, "notes": notes})
+        return await cur.fetchone()
+
+async def edit_entry(conn, entry_id: int, hours: float, notes: Optional[str]) -> Optional[dict]:
+    """The updated row, or None if there is no such draft entry."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, EDIT_ENTRY_SQL, (hours, notes, entry_id))
+        return await cur.fetchone()
+
+async def delete_entry(conn, entry_id: int) -> Optional[dict]:
+    """{id, work_date} of the deleted entry, or None."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, DELETE_ENTRY_SQL, (entry_id,))
+        return await cur.fetchone()
+
+# ---------- status changes ----------
+# Every change to the approvals queue announces the ids it moved on
+# APPROVALS_CHANNEL, from the same statement (so it costs no extra round
+# trip); Postgres delivers it on commit. Bigger changes send ids: null and
+# listeners reload instead. Payload: {"status": <new status>, "ids": [...]},
+# status "deleted" for submitted entries that were deleted.
+APPROVALS_CHANNEL = "v2_approvals"
+NOTIFY_MAX_IDS = 500
+
+def _notify(status: str) -> str:
+    """pg_notify() of the `id`s aggregated over a changed-rows CTE."""
+    return f"""pg_notify('{APPROVALS_CHANNEL}', json_build_object(
+             'status', {status},
+             'ids', CASE WHEN count(*) <= {NOTIFY_MAX_IDS} THEN json_agg(id ORDER BY id) END)::text)"""
+
+def _notifying(update: str) -> str:
+    """Wrap an UPDATE of v2_time_entries; the statement yields (rows changed) or no row."""
+    return hot(f"""
+    WITH changed AS ({update} RETURNING id, status)
+    SELECT count(*)::int, {_notify("min(status)")}
+      FROM changed
+    HAVING count(*) > 0;
+""")
+
+DELETE_ENTRY_SQL = hot(f"""
+    WITH gone AS (DELETE FROM v2_time_entries WHERE id=%s RETURNING id, work_date, status),
+         queued AS (SELECT {_notify("'deleted'")} FROM gone WHERE status = 'submitted' HAVING count(*) > 0)
+    SELECT id, work_date FROM gone LEFT JOIN queued ON TRUE;
+""")
+
+# the cascade would take the person's submitted entries out of the queue
+# unannounced, so they go first, in the same statement
+DELETE_PERSON_SQL = f"""
+    WITH person AS (DELETE FROM v2_people WHERE id=%s),
+         gone AS (DELETE FROM v2_time_entries WHERE person_id=%s AND status='submitted' RETURNING id)
+    SELECT {_notify("'deleted'")} FROM gone HAVING count(*) > 0;
+"""
+
+async def _changed(cur, query: str, params) -> int:
+    await execute(cur, query, params)
+    row = await cur.fetchone()
+    return row[0] if row else 0
+
+SUBMIT_WEEK_SQL = _notifying("""
+    UPDATE v2_time_entries
+       SET status='submitted'
+     WHERE person_id=%s AND work_date BETWEEN %s AND %s AND status='draft'
+""")
+
+async def submit_week(conn, person_id: int, start: date, end: date) -> int:
+    """Submit a person's draft entries in the ISO week [start, end]; returns
+    rows changed. The UPDATE runs after the week lock is held, so its snapshot
+    includes every add that got the lock first."""
+    async with conn.cursor() as cur:
+        await lock_week(cur, person_id, start)
+        return await _changed(cur, SUBMIT_WEEK_SQL, (person_id, start, end))
+
+# ---------- summaries ----------
+# weekly_summary is kept current by triggers on v2_time_entries (migration 4),
+# so these read a handful of rows per person instead of scanning entries.
+# Status follows week_status(): all approved > any submitted > draft.
+WEEK_TOTALS_SQL = hot("""
+    SELECT ws.person_id, pe.name AS person_name,
+           sum(ws.total_hours) AS total_hours, sum(ws.entries)::int AS entries,
+           CASE WHEN sum(ws.approved_entries) = sum(ws.entries) THEN 'approved'
+                WHEN sum(ws.submitted_entries) > 0 THEN 'submitted'
+                ELSE 'draft' END AS status,
+           json_agg(json_build_object('project_id', NULLIF(ws.project_id, 0), 'hours', ws.total_hours)
+                    ORDER BY ws.project_id) AS projects
+      FROM weekly_summary ws
+ LEFT JOIN v2_people pe ON pe.id = ws.person_id
+     WHERE ws.iso_year = %(year)s AND ws.iso_week = %(week)s
+       AND (%(person_id)s::bigint IS NULL OR ws.person_id = %(person_id)s)
+  GROUP BY ws.person_id, pe.name
+  ORDER BY pe.name, ws.person_id;
+""")
+
+async def week_totals(conn, year: int, week: int, person_id: Optional[int] = None) -> List[dict]:
+    """Per-person totals for an ISO week; people with no entries are left out."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, WEEK_TOTALS_SQL, {"year": year, "week": week, "person_id": person_id})
+        return await cur.fetchall()
+
+PROJECT_MONTHS_SQL = hot("""
+    SELECT month, total_hours, approved_hours, entries, people, refreshed_at
+      FROM project_month_summary
+     WHERE project_id = %s
+  ORDER BY month;
+""")
+
+async def project_months(conn, project_id: int) -> List[dict]:
+    """Monthly totals for a project from project_month_summary (see app/scheduler.py)."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, PROJECT_MONTHS_SQL, (project_id,))
+        return await cur.fetchall()
+
+# ---------- approvals ----------
+# What approve / reject set the status to.
+DECISIONS = {"approve": "approved", "reject": "draft"}
+
+APPROVALS_PAGE_SIZE = 100
+APPROVALS_MAX_PAGE_SIZE = 500
+
+class ApprovalFilter(NamedTuple):
+    person_id: Optional[int] = None
+    project_id: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+def encode_cursor(row: dict) -> str:
+    return f"{row['person_id']}.{row['work_date'].isoformat()}.{row['id']}"
+
+def decode_cursor(cursor: str) -> Tuple[int, date, int]:
+    """Inverse of encode_cursor(); raises ValueError on garbage."""
+    person_id, work_date, entry_id = cursor.split(".")
+    return int(person_id), date.fromisoformat(work_date), int(entry_id)
+
+def _submitted_query(filters: ApprovalFilter, after: Optional[str], limit: int,
+                     ids: Optional[List[int]] = None) -> Tuple[sql.Composed, list]:
+    """The page query for list_submitted(); asks for limit + 1 rows."""
+    where = [sql.SQL("te.status = 'submitted'")]
+    params: list = []
+    if ids is not None:
+        where.append(sql.SQL("te.id = ANY(%s)"))
+        params.append(ids)
+    if filters.person_id is not None:
+        where.append(sql.SQL("te.person_id = %s"))
+        params.append(filters.person_id)
+    if filters.project_id is not None:
+        where.append(sql.SQL("te.project_id = %s"))
+        params.append(filters.project_id)
+    if filters.date_from is not None:
+        where.append(sql.SQL("te.work_date >= %s"))
+        params.append(filters.date_from)
+    if filters.date_to is not None:
+        where.append(sql.SQL("te.work_date <= %s"))
+        params.append(filters.date_to)
+    if after:
+        where.append(sql.SQL("(te.person_id, te.work_date, te.id) > (%s, %s, %s)"))
+        params.extend(decode_cursor(after))
+    limit = max(1, min(limit, APPROVALS_MAX_PAGE_SIZE))
+
+    query = sql.SQL("""
+        SELECT te.id, te.person_id, pe.name AS person_name, te.work_date, te.hours, te.notes, te.status,
+               p.code AS project_code, p.name AS project_name, te.updated_at
+          FROM v2_time_entries te
+     LEFT JOIN v2_people pe   ON pe.id = te.person_id
+     LEFT JOIN v2_projects p  ON p.id = te.project_id
+         WHERE {where}
+      ORDER BY te.person_id, te.work_date, te.id
+         LIMIT %s
+    """).format(where=sql.SQL(" AND ").join(where))
+    # one extra row tells us whether there is a next page
+    return query, params + [limit + 1]
+
+async def list_submitted(
+    conn,
+    filters: ApprovalFilter = ApprovalFilter(),
+    after: Optional[str] = None,
+    limit: int = APPROVALS_PAGE_SIZE,
+) -> Tuple[List[dict], Optional[str]]:
+    """One page of submitted entries in (person_id, work_date, id) order.
+
+    Keyset pagination: `after` is the cursor of the last row already seen, so
+    every page is a range scan on the v2_time_entries_submitted partial index.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, APPROVALS_MAX_PAGE_SIZE))
+    async with conn.cursor(row_factory=dict_row) as cur:
+        # one statement per filter combination; each is prepared like a hot one
+        await cur.execute(*_submitted_query(filters, after, limit), prepare=True)
+        rows = await cur.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+async def submitted_by_id(conn, filters: ApprovalFilter, ids: List[int]) -> List[dict]:
+    """Those of `ids` that are still submitted and match `filters`, in page
+    order (for live updates of an open approvals page)."""
+    ids = ids[:APPROVALS_MAX_PAGE_SIZE]
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(*_submitted_query(filters, None, len(ids) or 1, ids), prepare=True)
+        return await cur.fetchall()
+
+class SubmittedRows(RowStream):
+    """list_submitted() streamed from a server-side cursor; next_cursor is
+    known once iteration has reached the end of the page."""
+
+    def __init__(self, conn, filters: ApprovalFilter = ApprovalFilter(),
+                 after: Optional[str] = None, limit: int = APPROVALS_PAGE_SIZE) -> None:
+        self.limit = max(1, min(limit, APPROVALS_MAX_PAGE_SIZE))
+        super().__init__(conn, *_submitted_query(filters, after, self.limit), name="approvals_page")
+        self.next_cursor: Optional[str] = None
+        self._seen, self._last = 0, None
+
+    async def __anext__(self) -> dict:
+        row = await super().__anext__()
+        if self._seen == self.limit:
+            self.next_cursor = encode_cursor(self._last)
+            await self.aclose()
+            raise StopAsyncIteration
+        self._seen, self._last = self._seen + 1, row
+        return row
+
+# ---------- page versions ----------
+# Change counters bumped by triggers (migration 9), for ETags: one primary-key
+# read per page instead of scanning the rows it shows.
+CHANGE_VERSIONS_SQL = hot("SELECT name, version, changed_at FROM v2_change_counters WHERE name = ANY(%s);")
+
+async def change_versions(conn, *names: str) -> dict:
+    """{name: version, name_at: changed_at} for counters "people", "projects"
+    and "approvals" (the queue: any write touching a submitted entry)."""
+    async with conn.cursor() as cur:
+        await execute(cur, CHANGE_VERSIONS_SQL, (list(names),))
+        version = {}
+        for name, number, changed_at in await cur.fetchall():
+            version[name], version[f"{name}_at"] = number, changed_at
+        return version
+
+SET_STATUS_SQL = _notifying("UPDATE v2_time_entries SET status=%s WHERE id=%s")
+
+SET_STATUS_MANY_SQL = _notifying("""
+    UPDATE v2_time_entries SET status=%s
+     WHERE id = ANY(%s) AND status='submitted'
+""")
+
+SET_WEEK_STATUS_SQL = _notifying("""
+    UPDATE v2_time_entries SET status=%s
+     WHERE person_id=%s AND work_date BETWEEN %s AND %s AND status='submitted'
+""")
+
+async def set_entry_status(conn, entry_id: int, new_status: str) -> bool:
+    """Returns False if the entry doesn't exist."""
+    async with conn.cursor() as cur:
+        return await _changed(cur, SET_STATUS_SQL, (new_status, entry_id)) > 0
+
+async def set_status_many(conn, entry_ids: List[int], new_status: str) -> int:
+    """Move the given submitted entries to new_status; returns rows changed."""
+    async with conn.cursor() as cur:
+        return await _changed(cur, SET_STATUS_MANY_SQL, (new_status, entry_ids))
+
+async def set_week_status(conn, person_id: int, start: date, end: date, new_status: str) -> int:
+    """Move all of a person's submitted entries in [start, end] to new_status."""
+    async with conn.cursor() as cur:
+        return await _changed(cur, SET_WEEK_STATUS_SQL, (new_status, person_id, start, end))
+
+# ---------- people / projects ----------
+REF_DATA_SQL = hot("""
+    SELECT
+      (SELECT COALESCE(json_agg(json_build_object('id', id, 'name', name) ORDER BY name), '[]'::json)
+         FROM v2_people) AS people,
+      (SELECT COALESCE(json_agg(json_build_object('id', id, 'code', code, 'name', name) ORDER BY name), '[]'::json)
+         FROM v2_projects WHERE is_active IS TRUE) AS projects;
+""")
+
+async def fetch_ref_data(conn) -> Tuple[List[dict], List[dict]]:
+    """(people, active projects) in the shape MY_WEEK_SQL returns them."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, REF_DATA_SQL)
+        row = await cur.fetchone()
+        return row["people"], row["projects"]
+
+PEOPLE_SQL = hot("SELECT id, name, email, created_at FROM v2_people ORDER BY name;")
+PROJECTS_SQL = hot("SELECT id, code, name, is_active FROM v2_projects ORDER BY is_active DESC, name;")
+ACTIVE_PROJECTS_SQL = hot("SELECT id, code, name, is_active FROM v2_projects WHERE is_active IS TRUE ORDER BY name;")
+
+async def list_people(conn) -> List[dict]:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, PEOPLE_SQL)
+        return await cur.fetchall()
+
+async def list_projects(conn, active_only: bool = False) -> List[dict]:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await execute(cur, ACTIVE_PROJECTS_SQL if active_only else PROJECTS_SQL)
+        return await cur.fetchall()
+
+def stream_people(conn) -> RowStream:
+    return RowStream(conn, PEOPLE_SQL, name="people")
+
+def stream_projects(conn) -> RowStream:
+    return RowStream(conn, PROJECTS_SQL, name="projects")
@@ -0,0 +1,284 @@
+# app/reports.py
+"""Utilization and budget reports over the app/schema.sql model.
+
+    GET /api/v1/reports/utilization?from=2026-01&to=2026-03
+    GET /api/v1/reports/projects/{project_id}/burndown
+    GET /api/v1/reports/budget-alerts?threshold=0.8
+    python -m app.reports [--every 900]   # refresh the views
+
+Reads come from the report_* materialized views defined in app/schema.sql
+(created by scripts/init_db.py), which pre-aggregate time_entries with
+GROUPING SETS; rejected entries are left out. The views lag the data until
+the next refresh, which runs CONCURRENTLY so readers are never blocked.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date
+from typing import List, Optional
+
+import psycopg
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from psycopg import sql
+from psycopg.rows import dict_row
+from pydantic import BaseModel
+from starlette import status
+
+from app.db import CONNECT_KWARGS, connect, db_url
+
+router = APIRouter(prefix="/api/v1/reports", tags=["reports"], default_response_class=ORJSONResponse)
+
+REPORT_VIEWS = ("report_project_month", "report_utilization")
+
+# Months of history the budget projection averages over.
+BURN_RATE_MONTHS = 3
+
+def month_start(value: str) -> date:
+    """'2026-01' or '2026-01-15' -> date(2026, 1, 1)."""
+    d = date.fromisoformat(value + "-01" if len(value) == 7 else value)
+    return d.replace(day=1)
+
+# ---------- queries ----------
+async def refresh_views(conn) -> dict:
+    """REFRESH ... CONCURRENTLY every report view; returns seconds spent per view."""
+    timings = {}
+    for view in REPORT_VIEWS:
+        started = time.perf_counter()
+        await conn.execute(sql.SQL("REFRESH MATERIALIZED VIEW CONCURRENTLY {};").format(sql.Identifier(view)))
+        await conn.commit()
+        timings[view] = round(time.perf_counter() - started, 3)
+    return timings
+
+UTILIZATION_ALL_SQL = """
+    SELECT u.level, NULLIF(u.user_id, 0) AS user_id, us.name AS user_name,
+           NULLIF(u.month, '-infinity') AS month, u.hours, u.billable_hours
+      FROM report_utilization u
+ LEFT JOIN users us ON us.id = u.user_id
+     WHERE u.level IN (1, 2, 3)
+  ORDER BY u.level, us.name, u.month;
+"""
+
+# With a month range the precomputed totals don't apply, so the person+month
+# rows are rolled up again here: still only one row per person per month.
+UTILIZATION_RANGE_SQL = """
+    SELECT grouping(u.user_id, u.month) AS level, u.user_id,
+           CASE WHEN grouping(u.user_id) = 0 THEN min(us.name) END AS user_name, u.month,
+           sum(u.hours) AS hours, sum(u.billable_hours) AS billable_hours
+      FROM report_utilization u
+ LEFT JOIN users us ON us.id = u.user_id
+     WHERE u.level = 0 AND u.month BETWEEN %(start)s AND %(end)s
+  GROUP BY GROUPING SETS ((u.user_id), (u.month), ())
+  ORDER BY 1, 3, u.month;
+"""
+
+def _utilization_row(row: dict) -> dict:
+    hours = float(row["hours"] or 0)
+    billable = float(row["billable_hours"] or 0)
+    return {
+        "user_id": row["user_id"],
+        "user_name": row["user_name"],
+        "month": row["month"],
+        "hours": hours,
+        "billable_hours": billable,
+        "non_billable_hours": hours - billable,
+        "utilization": round(billable / hours, 4) if hours else None,
+    }
+
+async def utilization(conn, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Billable vs non-billable hours: per person, per month (team) and overall."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        if start is None and end is None:
+            await cur.execute(UTILIZATION_ALL_SQL)
+        else:
+            await cur.execute(UTILIZATION_RANGE_SQL, {"start": start or date.min, "end": end or date.max})
+        rows = await cur.fetchall()
+    out = {"people": [], "months": [], "total": None}
+    for row in rows:
+        item = _utilization_row(row)
+        if row["level"] == 1:
+            out["people"].append(item)
+        elif row["level"] == 2:
+            out["months"].append(item)
+        else:
+            out["total"] = item
+    if out["total"] is None:
+        out["total"] = _utilization_row({"user_id": None, "user_name": None, "month": None,
+                                         "hours": 0, "billable_hours": 0})
+    return out
+
+BURNDOWN_SQL = """
+    SELECT p.id AS project_id, p.code, p.name, p.budget_hours,
+           r.month, r.hours, r.billable_hours,
+           sum(r.hours) OVER (ORDER BY r.month) AS cumulative_hours
+      FROM projects p
+ LEFT JOIN report_project_month r ON r.project_id = p.id AND r.level = 0
+     WHERE p.id = %s
+  ORDER BY r.month;
+"""
+
+async def burndown(conn, project_id: int) -> Optional[dict]:
+    """Monthly burn against budget_hours; None if the project doesn't exist."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(BURNDOWN_SQL, (project_id,))
+        rows = await cur.fetchall()
+    if not rows:
+        return None
+    head = rows[0]
+    budget = float(head["budget_hours"]) if head["budget_hours"] is not None else None
+    months = [{
+        "month": r["month"],
+        "hours": float(r["hours"]),
+        "billable_hours": float(r["billable_hours"]),
+        "cumulative_hours": float(r["cumulative_hours"]),
+        "remaining_hours": budget - float(r["cumulative_hours"]) if budget is not None else None,
+    } for r in rows if r["month"] is not None]
+    return {
+        "project_id": head["project_id"],
+        "code": head["code"],
+        "name": head["name"],
+        "budget_hours": budget,
+        "used_hours": months[-1]["cumulative_hours"] if months else 0.0,
+        "months": months,
+    }
+
+# Project totals come from the level-1 rows; the burn rate averages the last
+# BURN_RATE_MONTHS months that have any hours.
+BUDGET_ALERTS_SQL = """
+    SELECT p.id AS project_id, p.code, p.name, c.name AS client_name, p.budget_hours,
+           t.hours AS used_hours,
+           (SELECT avg(m.hours) FROM (
+               SELECT hours FROM report_project_month
+                WHERE level = 0 AND project_id = p.id
+             ORDER BY month DESC LIMIT %(months)s) m) AS monthly_burn
+      FROM projects p
+      JOIN clients c ON c.id = p.client_id
+      JOIN report_project_month t ON t.project_id = p.id AND t.level = 1
+     WHERE p.status <> 'closed' AND p.budget_hours > 0
+       AND t.hours >= p.budget_hours * %(threshold)s
+  ORDER BY t.hours / p.budget_hours DESC;
+"""
+
+async def budget_alerts(conn, threshold: float = 0.8) -> List[dict]:
+    """Open projects that have used at least `threshold` of budget_hours."""
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(BUDGET_ALERTS_SQL, {"threshold": threshold, "months": BURN_RATE_MONTHS})
+        rows = await cur.fetchall()
+    alerts = []
+    for r in rows:
+        budget, used = float(r["budget_hours"]), float(r["used_hours"])
+        burn = float(r["monthly_burn"] or 0)
+        remaining = budget - used
+        alerts.append({
+            "project_id": r["project_id"],
+            "code": r["code"],
+            "name": r["name"],
+            "client_name": r["client_name"],
+            "budget_hours": budget,
+            "used_hours": used,
+            "pct_used": round(used / budget, 4),
+            "level": "over" if remaining < 0 else "warning",
+            "monthly_burn": round(burn, 2),
+            "months_left": round(remaining / burn, 1) if burn and remaining > 0 else None,
+        })
+    return alerts
+
+# ---------- response models ----------
+class Utilization(BaseModel):
+    user_id: Optional[int] = None
+    user_name: Optional[str] = None
+    month: Optional[date] = None
+    hours: float
+    billable_hours: float
+    non_billable_hours: float
+    utilization: Optional[float] = None
+
+class UtilizationReport(BaseModel):
+    people: List[Utilization]
+    months: List[Utilization]
+    total: Utilization
+
+class BurnMonth(BaseModel):
+    month: date
+    hours: float
+    billable_hours: float
+    cumulative_hours: float
+    remaining_hours: Optional[float] = None
+
+class Burndown(BaseModel):
+    project_id: int
+    code: str
+    name: str
+    budget_hours: Optional[float] = None
+    used_hours: float
+    months: List[BurnMonth]
+
+class BudgetAlert(BaseModel):
+    project_id: int
+    code: str
+    name: str
+    client_name: str
+    budget_hours: float
+    used_hours: float
+    pct_used: float
+    level: str
+    monthly_burn: float
+    months_left: Optional[float] = None
+
+# ---------- routes ----------
+def _not_set_up() -> HTTPException:
+    return HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE,
+                         "report views missing; run scripts/init_db.py")
+
+@router.get("/utilization", response_model=UtilizationReport)
+async def api_utilization(date_from: Optional[str] = Query(None, alias="from"),
+                          date_to: Optional[str] = Query(None, alias="to")):
+    """Whole history by default; `from` / `to` are months (YYYY-MM), inclusive."""
+    try:
+        start = month_start(date_from) if date_from else None
+        end = month_start(date_to) if date_to else None
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, str(e))
+    async with connect() as conn:
+        try:
+            return await utilization(conn, start, end)
+        except psycopg.errors.UndefinedTable:
+            raise _not_set_up()
+
+@router.get("/projects/{project_id}/burndown", response_model=Burndown)
+async def api_burndown(project_id: int):
+    async with connect() as conn:
+        try:
+            report = await burndown(conn, project_id)
+        except psycopg.errors.UndefinedTable:
+            raise _not_set_up()
+    if report is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"project {project_id} not found")
+    return report
+
+@router.get("/budget-alerts", response_model=List[BudgetAlert])
+async def api_budget_alerts(threshold: float = Query(0.8, gt=0)):
+    async with connect() as conn:
+        try:
+            return await budget_alerts(conn, threshold)
+        except psycopg.errors.UndefinedTable:
+            raise _not_set_up()
+
+# ---------- CLI ----------
+async def _main(args: argparse.Namespace) -> None:
+    async with await psycopg.AsyncConnection.connect(db_url(), **CONNECT_KWARGS) as conn:
+        while True:
+            timings = await refresh_views(conn)
+            print(" ".join(f"{view}={secs}s" for view, secs in timings.items()), flush=True)
+            if not args.every:
+                return
+            await asyncio.sleep(args.every)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Refresh the report materialized views.")
+    ap.add_argument("--every", type=float, default=0, metavar="SECONDS",
+                    help="keep running and refresh on this interval (default: once)")
+    asyncio.run(_main(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
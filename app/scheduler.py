@@ -0,0 +1,229 @@
+# app/scheduler.py
+"""Background refresh of the rollups that triggers can't keep current.
+
+    python -m app.scheduler          # run as a separate worker
+    python -m app.scheduler --once   # drain the backlog once and exit
+
+or set ROLLUP_SCHEDULER=1 to run it inside each app worker (lifespan task).
+
+- weekly_summary (person, week) is exact already: its triggers apply deltas.
+- project_month_summary: writes to v2_time_entries mark (project, month)
+  buckets in rollup_dirty; each tick claims a batch with SKIP LOCKED (so
+  several workers can share the queue), rebuilds just those buckets and
+  deletes the claims in the same transaction. A backlog larger than
+  ROLLUP_FULL_THRESHOLD is cheaper to rebuild in one pass.
+- The report_* materialized views over the legacy tables have no dirty
+  tracking; they get REFRESH ... CONCURRENTLY every REPORTS_REFRESH_SECONDS,
+  skipped when the table statistics show no writes since the last refresh.
+
+`stats` holds lag and refresh-cost figures; /diag shows them.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from app import reports
+from app.db import close_pool, connect, env_float, env_int, open_pool
+
+ROLLUP_INTERVAL = env_float("ROLLUP_INTERVAL", 5.0)
+ROLLUP_BATCH = env_int("ROLLUP_BATCH", 500)
+ROLLUP_FULL_THRESHOLD = env_int("ROLLUP_FULL_THRESHOLD", 20_000)
+REPORTS_REFRESH_SECONDS = env_float("REPORTS_REFRESH_SECONDS", 900.0)
+
+# Only one process refreshes the report views at a time.
+REPORTS_LOCK_KEY = 720_002
+
+class SchedulerStats:
+    def __init__(self) -> None:
+        self.ticks = 0
+        self.errors = 0
+        self.buckets = 0
+        self.full_rebuilds = 0
+        self.last_lag_s: Optional[float] = None   # oldest claimed write -> rebuilt
+        self.max_lag_s = 0.0
+        self.last_batch_ms: Optional[float] = None
+        self.rollup_seconds = 0.0
+        self.backlog = 0
+        self.reports_refreshed_at: Optional[datetime] = None
+        self.reports_timings: dict = {}
+        self.reports_skipped = 0
+        self.reports_writes: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+stats = SchedulerStats()
+
+# ---------- project_month_summary ----------
+CLAIM_SQL = """
+    DELETE FROM rollup_dirty d
+     USING (SELECT project_id, month FROM rollup_dirty
+             ORDER BY dirtied_at
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED) c
+     WHERE (d.project_id, d.month) = (c.project_id, c.month)
+ RETURNING d.project_id, d.month, extract(epoch FROM now() - d.dirtied_at) AS lag;
+"""
+
+CLEAR_BUCKETS_SQL = """
+    DELETE FROM project_month_summary s
+     USING unnest(%s::bigint[], %s::date[]) AS c(project_id, month)
+     WHERE (s.project_id, s.month) = (c.project_id, c.month);
+"""
+
+REBUILD_BUCKETS_SQL = """
+    INSERT INTO project_month_summary (project_id, month, total_hours, approved_hours, entries, people)
+    SELECT c.project_id, c.month, a.total_hours, a.approved_hours, a.entries, a.people
+      FROM unnest(%s::bigint[], %s::date[]) AS c(project_id, month)
+CROSS JOIN LATERAL (
+           SELECT sum(hours) AS total_hours,
+                  COALESCE(sum(hours) FILTER (WHERE status = 'approved'), 0) AS approved_hours,
+                  count(*) AS entries, count(DISTINCT person_id) AS people
+             FROM v2_time_entries te
+            WHERE te.project_id = c.project_id
+              AND te.work_date >= c.month AND te.work_date < (c.month + interval '1 month')::date
+           ) a
+     WHERE a.entries > 0;
+"""
+
+FULL_REBUILD_SQL = """
+    DELETE FROM project_month_summary;
+    INSERT INTO project_month_summary (project_id, month, total_hours, approved_hours, entries, people)
+    SELECT project_id, date_trunc('month', work_date)::date, sum(hours),
+           COALESCE(sum(hours) FILTER (WHERE status = 'approved'), 0), count(*), count(DISTINCT person_id)
+      FROM v2_time_entries
+     WHERE project_id IS NOT NULL
+     GROUP BY 1, 2;
+"""
+
+async def rebuild_dirty(conn, batch: int = ROLLUP_BATCH) -> int:
+    """Claim and rebuild up to `batch` dirty buckets in one transaction; returns how many."""
+    started = time.perf_counter()
+    async with conn.cursor() as cur:
+        await cur.execute(CLAIM_SQL, (batch,))
+        claimed = await cur.fetchall()
+        if claimed:
+            keys = ([r[0] for r in claimed], [r[1] for r in claimed])
+            await cur.execute(CLEAR_BUCKETS_SQL, keys)
+            await cur.execute(REBUILD_BUCKETS_SQL, keys)
+    await conn.commit()
+    if claimed:
+        lag = float(max(r[2] for r in claimed))
+        stats.buckets += len(claimed)
+        stats.last_lag_s = round(lag, 3)
+        stats.max_lag_s = max(stats.max_lag_s, stats.last_lag_s)
+        elapsed = time.perf_counter() - started
+        stats.last_batch_ms = round(elapsed * 1000, 1)
+        stats.rollup_seconds += elapsed
+    return len(claimed)
+
+async def rebuild_all(conn) -> None:
+    """Recompute project_month_summary from scratch and clear the dirty set."""
+    started = time.perf_counter()
+    async with conn.cursor() as cur:
+        # Same lock order as rebuild_dirty: dirty rows first (waiting out
+        # in-flight claimers, which never wait on us, and writers still
+        # holding their markers), then the summary. A
+        # claimer arriving later only finds rows dirtied after this DELETE
+        # and queues behind the table lock.
+        await cur.execute("DELETE FROM rollup_dirty;")
+        await cur.execute("LOCK TABLE project_month_summary IN EXCLUSIVE MODE;")
+        await cur.execute(FULL_REBUILD_SQL)
+    await conn.commit()
+    stats.full_rebuilds += 1
+    stats.rollup_seconds += time.perf_counter() - started
+
+async def refresh_rollups(conn) -> None:
+    async with conn.cursor() as cur:
+        # counted only up to the threshold: enough to choose a strategy
+        await cur.execute("SELECT count(*) FROM (SELECT 1 FROM rollup_dirty LIMIT %s) d;",
+                          (ROLLUP_FULL_THRESHOLD + 1,))
+        stats.backlog = (await cur.fetchone())[0]
+    await conn.commit()
+    if stats.backlog > ROLLUP_FULL_THRESHOLD:
+        await rebuild_all(conn)
+        return
+    while await rebuild_dirty(conn) == ROLLUP_BATCH:
+        pass
+
+# ---------- report views ----------
+REPORT_WRITES_SQL = """
+    SELECT to_regclass('report_utilization') IS NOT NULL AS present,
+           (SELECT COALESCE(sum(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint
+              FROM pg_stat_user_tables
+             WHERE schemaname = current_schema()
+               AND relname IN ('time_entries', 'projects', 'users', 'clients')) AS writes;
+"""
+
+async def refresh_reports(conn) -> bool:
+    """Concurrent refresh of the report views if their inputs changed; False if skipped."""
+    async with conn.cursor() as cur:
+        await cur.execute(REPORT_WRITES_SQL)
+        present, writes = await cur.fetchone()
+        if not present or writes == stats.reports_writes:
+            await conn.commit()
+            stats.reports_skipped += 1
+            return False
+        await cur.execute("SELECT pg_try_advisory_lock(%s);", (REPORTS_LOCK_KEY,))
+        locked = (await cur.fetchone())[0]
+    await conn.commit()
+    if not locked:
+        return False
+    try:
+        stats.reports_timings = await reports.refresh_views(conn)
+        stats.reports_refreshed_at = datetime.now(timezone.utc)
+        stats.reports_writes = writes
+    finally:
+        # a failed REFRESH leaves the transaction aborted; the session lock
+        # outlives the rollback, and must not go back to the pool with it
+        await conn.rollback()
+        await conn.execute("SELECT pg_advisory_unlock(%s);", (REPORTS_LOCK_KEY,))
+        await conn.commit()
+    return True
+
+# ---------- loop ----------
+async def tick(reports_due: bool) -> None:
+    async with connect() as conn:
+        await refresh_rollups(conn)
+        if reports_due:
+            await refresh_reports(conn)
+    stats.ticks += 1
+
+async def run_forever() -> None:
+    """Tick every ROLLUP_INTERVAL seconds until cancelled; errors are logged and retried."""
+    next_reports = 0.0
+    while True:
+        try:
+            reports_due = time.monotonic() >= next_reports
+            await tick(reports_due)
+            if reports_due:
+                next_reports = time.monotonic() + REPORTS_REFRESH_SECONDS
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.errors += 1
+            print(f"WARNING: rollup refresh failed ({e})", file=sys.stderr)
+        await asyncio.sleep(ROLLUP_INTERVAL)
+
+# ---------- CLI ----------
+async def _main(args: argparse.Namespace) -> None:
+    await open_pool()
+    try:
+        if args.once:
+            await tick(reports_due=True)
+            print(" ".join(f"{k}={v}" for k, v in stats.as_dict().items()))
+        else:
+            await run_forever()
+    finally:
+        await close_pool()
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Keep rollups and report views fresh.")
+    ap.add_argument("--once", action="store_true", help="run one tick and exit")
+    asyncio.run(_main(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -77,6 +77,8 @@ CREATE TABLE IF NOT EXISTS approvals (
   comment       TEXT,
   decided_at    TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+-- for the ON DELETE CASCADE from time_entries (otherwise a scan per deleted entry)
+CREATE INDEX IF NOT EXISTS idx_approvals_time_entry ON approvals(time_entry_id);
 
 -- simple updated_at triggers
 CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
@@ -99,3 +101,29 @@ IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'time_entries_touch_updat
   CREATE TRIGGER time_entries_touch_updated_at BEFORE UPDATE ON time_entries FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
 END IF;
 END $$;
+
+-- reporting rollups (app/reports.py); refreshed with
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY, which needs the unique indexes.
+-- Rolled-up grouping levels store 0 / '-infinity' instead of NULL keys.
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_project_month AS
+SELECT grouping(month) AS level,            -- 0 = project+month, 1 = project total
+       project_id,
+       COALESCE(month, '-infinity') AS month,
+       sum(hours) AS hours,
+       COALESCE(sum(hours) FILTER (WHERE billable), 0) AS billable_hours,
+       count(*) AS entries
+  FROM (SELECT project_id, date_trunc('month', work_date)::date AS month, hours, billable
+          FROM time_entries WHERE state <> 'rejected') te
+ GROUP BY GROUPING SETS ((project_id, month), (project_id));
+CREATE UNIQUE INDEX IF NOT EXISTS report_project_month_key ON report_project_month(level, project_id, month);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_utilization AS
+SELECT grouping(user_id, month) AS level,   -- 0 = person+month, 1 = person, 2 = month, 3 = everything
+       COALESCE(user_id, 0) AS user_id,
+       COALESCE(month, '-infinity') AS month,
+       COALESCE(sum(hours), 0) AS hours,
+       COALESCE(sum(hours) FILTER (WHERE billable), 0) AS billable_hours
+  FROM (SELECT user_id, date_trunc('month', work_date)::date AS month, hours, billable
+          FROM time_entries WHERE state <> 'rejected') te
+ GROUP BY GROUPING SETS ((user_id, month), (user_id), (month), ());
+CREATE UNIQUE INDEX IF NOT EXISTS report_utilization_key ON report_utilization(level, user_id, month);
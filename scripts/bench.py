@@ -0,0 +1,316 @@
+"""Load benchmark for the hot pages against a local Postgres.
+
+Starts Postgres (a throwaway pg_ctl cluster or a docker container), applies
+the migrations, seeds people, projects and a few months of entries with
+app.datagen, starts the app under uvicorn and drives each scenario in turn
+at a fixed concurrency:
+
+    my-week     GET  /my-week for a random person and seeded week
+    add         POST /time/add into the current week
+    approvals   GET  /approvals (first page)
+    submit      POST /time/submit-week for the current week
+
+Per scenario it reports p50/p95/p99 latency, throughput and database
+queries per request (read from the Server-Timing header the app sends), and
+writes everything to bench-results/<commit>-<UTC time>.json. Pass an older
+file to --compare to see what changed between commits.
+
+    python scripts/bench.py --pg temp                   # pg_ctl cluster in a temp dir
+    python scripts/bench.py --pg docker                 # postgres:16 container
+    python scripts/bench.py --database-url "$DATABASE_URL" --seed   # existing database
+    python scripts/bench.py --pg temp --compare bench-results/abc1234-....json
+
+The client runs in this process (one thread and keep-alive connection per
+concurrent user), so keep --concurrency well within what one Python
+process can drive, or the client becomes the bottleneck. initdb refuses to
+run as root; use --pg docker or --database-url there.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import date, datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+import psycopg
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ("my-week", "add", "approvals", "submit")
+TIMING_ENTRY = re.compile(r'(\w+);(?:dur=([\d.]+)|desc="(\d+)")')
+
+# ---------- Postgres ----------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def pg_bin(name: str, bindir: str) -> str:
+    if bindir:
+        return str(Path(bindir) / name)
+    found = shutil.which(name)
+    if found:
+        return found
+    out = subprocess.run(["pg_config", "--bindir"], capture_output=True, text=True, check=True)
+    return str(Path(out.stdout.strip()) / name)
+
+def wait_for_db(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            psycopg.connect(url, connect_timeout=2).close()
+            return
+        except psycopg.OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+def start_temp_cluster(stack: ExitStack, bindir: str) -> str:
+    """initdb + pg_ctl in a temp dir; stopped and removed on exit."""
+    datadir = tempfile.mkdtemp(prefix="bench-pg-")
+    stack.callback(shutil.rmtree, datadir, ignore_errors=True)
+    port = free_port()
+    subprocess.run([pg_bin("initdb", bindir), "-D", datadir, "-U", "postgres", "-A", "trust",
+                    "-E", "UTF8", "--no-sync"], check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([pg_bin("pg_ctl", bindir), "-D", datadir, "-w", "-l", f"{datadir}/server.log",
+                    "-o", f"-p {port} -k {datadir} -c listen_addresses=127.0.0.1", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    stack.callback(subprocess.run, [pg_bin("pg_ctl", bindir), "-D", datadir, "-m", "fast", "stop"],
+                   stdout=subprocess.DEVNULL)
+    admin = f"postgresql://postgres@127.0.0.1:{port}/postgres"
+    with psycopg.connect(admin, autocommit=True) as conn:
+        conn.execute("CREATE DATABASE bench;")
+    return f"postgresql://postgres@127.0.0.1:{port}/bench"
+
+def start_container(stack: ExitStack, image: str) -> str:
+    port = free_port()
+    out = subprocess.run(["docker", "run", "-d", "--rm", "-e", "POSTGRES_HOST_AUTH_METHOD=trust",
+                          "-e", "POSTGRES_DB=bench", "-p", f"127.0.0.1:{port}:5432", image],
+                         capture_output=True, text=True, check=True)
+    container = out.stdout.strip()
+    stack.callback(subprocess.run, ["docker", "stop", container], stdout=subprocess.DEVNULL)
+    url = f"postgresql://postgres@127.0.0.1:{port}/bench"
+    wait_for_db(url)
+    return url
+
+# ---------- data ----------
+def migrate(url: str) -> None:
+    subprocess.run([sys.executable, "-m", "app.migrations"], cwd=REPO_ROOT,
+                   env={**os.environ, "DATABASE_URL": url}, check=True, stdout=subprocess.DEVNULL)
+
+def seed(url: str, people: int, projects: int, weeks: int, random_seed: int) -> None:
+    """Synthetic people, projects and entries from app.datagen (v2 tables)."""
+    subprocess.run([sys.executable, "-m", "app.datagen", "--people", str(people), "--projects", str(projects),
+                    "--weeks", str(weeks), "--seed", str(random_seed)],
+                   cwd=REPO_ROOT, env={**os.environ, "DATABASE_URL": url}, check=True)
+
+# ---------- app ----------
+def start_app(stack: ExitStack, url: str, workers: int) -> str:
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": url, "MIGRATE_ON_STARTUP": "0"}
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers),
+                             "--log-level", "warning", "--no-access-log"], cwd=REPO_ROOT, env=env)
+    stack.callback(proc.wait, 30)
+    stack.callback(proc.terminate)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return f"127.0.0.1:{port}"
+        except OSError:
+            pass
+        if proc.poll() is not None or time.monotonic() > deadline:
+            raise SystemExit("app did not start")
+        time.sleep(0.2)
+
+# ---------- load ----------
+class Target:
+    """Ids and weeks the scenarios pick from."""
+
+    def __init__(self, url: str) -> None:
+        with psycopg.connect(url) as conn:
+            self.people = [r[0] for r in conn.execute("SELECT id FROM v2_people;")]
+            self.projects = [r[0] for r in conn.execute("SELECT id FROM v2_projects WHERE is_active;")]
+            self.weeks = [tuple(r) for r in conn.execute("""
+                SELECT DISTINCT extract(isoyear FROM work_date)::int, extract(week FROM work_date)::int
+                  FROM v2_time_entries;""")] or [date.today().isocalendar()[:2]]
+        if not self.people or not self.projects:
+            raise SystemExit("no people or projects to benchmark with; pass --seed")
+        self.year, self.week, _ = date.today().isocalendar()
+
+    def request(self, scenario: str, rng: random.Random):
+        """(method, path, form body or None, expected status)"""
+        person_id = rng.choice(self.people)
+        if scenario == "my-week":
+            year, week = rng.choice(self.weeks)
+            return "GET", f"/my-week?year={year}&week={week}&person_id={person_id}", None, 200
+        if scenario == "approvals":
+            return "GET", "/approvals", None, 200
+        form = {"person_id": person_id, "year": self.year, "week": self.week}
+        if scenario == "add":
+            work_date = date.fromisocalendar(self.year, self.week, rng.randint(1, 5))
+            form.update(work_date=work_date.isoformat(), project_id=rng.choice(self.projects),
+                        hours=rng.choice((0.5, 1, 2, 4)))
+            return "POST", "/time/add", urlencode(form), 303
+        return "POST", "/time/submit-week", urlencode(form), 303
+
+def parse_server_timing(header: str) -> dict:
+    return {name: float(dur) if dur else int(desc) for name, dur, desc in TIMING_ENTRY.findall(header or "")}
+
+def worker(host: str, target: Target, scenario: str, rng: random.Random,
+           record_from: float, stop_at: float, samples: list, errors: list) -> None:
+    conn = http.client.HTTPConnection(*host.split(":"), timeout=30)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    while True:
+        method, path, body, expected = target.request(scenario, rng)
+        started = time.perf_counter()
+        if started >= stop_at:
+            break
+        try:
+            conn.request(method, path, body, headers if body else {})
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == expected
+            timing = parse_server_timing(resp.getheader("Server-Timing"))
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            ok, timing = False, {"error": str(e)}
+        elapsed = time.perf_counter() - started
+        if started < record_from:
+            continue
+        if ok:
+            samples.append((elapsed, timing.get("dbq", 0), timing.get("db", 0.0)))
+        else:
+            errors.append(path)
+    conn.close()
+
+def percentile(cuts: list, p: int) -> float:
+    return round(cuts[p - 1] * 1000, 2)
+
+def run_scenario(host: str, target: Target, scenario: str, args: argparse.Namespace) -> dict:
+    samples: list = []
+    errors: list = []
+    record_from = time.perf_counter() + args.warmup
+    stop_at = record_from + args.duration
+    threads = [threading.Thread(target=worker, args=(host, target, scenario, random.Random(args.random_seed * 1000 + i),
+                                                     record_from, stop_at, samples, errors))
+               for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if len(samples) < 2:
+        raise SystemExit(f"{scenario}: only {len(samples)} successful requests ({len(errors)} errors)")
+    latencies = [s[0] for s in samples]
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "throughput_rps": round(len(samples) / args.duration, 1),
+        "latency_ms": {
+            "p50": percentile(cuts, 50),
+            "p95": percentile(cuts, 95),
+            "p99": percentile(cuts, 99),
+            "mean": round(statistics.fmean(latencies) * 1000, 2),
+            "max": round(max(latencies) * 1000, 2),
+        },
+        "queries_per_request": round(statistics.fmean(s[1] for s in samples), 2),
+        "db_ms_per_request": round(statistics.fmean(s[2] for s in samples), 2),
+    }
+
+# ---------- report ----------
+def git_commit() -> str:
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+def print_results(results: dict, baseline: dict) -> None:
+    print(f"{'scenario':<10} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'errors':>6}")
+    for name, r in results.items():
+        lat = r["latency_ms"]
+        print(f"{name:<10} {r['throughput_rps']:>8} {lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} "
+              f"{r['queries_per_request']:>6} {r['errors']:>6}")
+        old = baseline.get(name)
+        if old:
+            def delta(new, prev):
+                return f"{(new - prev) / prev:+.0%}" if prev else "n/a"
+            print(f"{'  vs base':<10} {delta(r['throughput_rps'], old['throughput_rps']):>8} "
+                  + " ".join(f"{delta(lat[p], old['latency_ms'][p]):>8}" for p in ("p50", "p95", "p99"))
+                  + f" {delta(r['queries_per_request'], old['queries_per_request']):>6}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    db = ap.add_mutually_exclusive_group(required=True)
+    db.add_argument("--pg", choices=("temp", "docker"), help="start a throwaway Postgres")
+    db.add_argument("--database-url", help="use an existing database (not seeded unless --seed)")
+    ap.add_argument("--pg-bin", default=os.getenv("PG_BIN", ""), help="directory with initdb/pg_ctl")
+    ap.add_argument("--image", default="postgres:16", help="image for --pg docker")
+    ap.add_argument("--seed", action="store_true", help="seed --database-url too")
+    ap.add_argument("--people", type=int, default=200)
+    ap.add_argument("--projects", type=int, default=40)
+    ap.add_argument("--weeks", type=int, default=12)
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("--duration", type=float, default=20.0, help="measured seconds per scenario")
+    ap.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each scenario")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument("--random-seed", type=int, default=1, help="seed for generated data and request mix")
+    ap.add_argument("--out", help="result file (default bench-results/<commit>-<time>.json)")
+    ap.add_argument("--compare", help="earlier result file to diff against")
+    args = ap.parse_args()
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with ExitStack() as stack:
+        if args.pg == "temp":
+            url = start_temp_cluster(stack, args.pg_bin)
+        elif args.pg == "docker":
+            url = start_container(stack, args.image)
+        else:
+            url = args.database_url
+        migrate(url)
+        if args.pg or args.seed:
+            started = time.perf_counter()
+            seed(url, args.people, args.projects, args.weeks, args.random_seed)
+            print(f"seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        target = Target(url)
+        host = start_app(stack, url, args.workers)
+        results = {}
+        for scenario in scenarios:
+            print(f"running {scenario} ...", file=sys.stderr)
+            results[scenario] = run_scenario(host, target, scenario, args)
+
+    baseline = json.loads(Path(args.compare).read_text())["results"] if args.compare else {}
+    print_results(results, baseline)
+    commit = git_commit()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out = Path(args.out) if args.out else REPO_ROOT / "bench-results" / f"{commit}-{stamp}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "commit": commit,
+        "started_at": stamp,
+        "config": {k: getattr(args, k) for k in ("pg", "image", "people", "projects", "weeks",
+                                                 "concurrency", "duration", "warmup", "workers", "random_seed")},
+        "results": results,
+    }, indent=2) + "\n")
+    print(f"wrote {out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
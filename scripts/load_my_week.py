@@ -0,0 +1,62 @@
+"""Concurrency check for /my-week against a running server.
+
+Fires one request to measure single-request latency, then N concurrent
+requests. If the handlers block the event loop, the concurrent batch takes
+about N x the single latency; with non-blocking DB access it should take
+closer to 1x (bounded by the pool size and server CPU). Point the server at
+a database with real network latency; against a local socket the run is
+CPU-bound and the speedup says little.
+
+    uvicorn app.main:app &
+    python scripts/load_my_week.py --url http://127.0.0.1:8000 -n 20
+"""
+import argparse
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+def fetch(url: str) -> float:
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(url) as resp:
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"{url} -> HTTP {resp.status}")
+    return time.perf_counter() - t0
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--path", default="/my-week")
+    ap.add_argument("-n", "--concurrency", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--min-speedup", type=float, default=2.0,
+                    help="exit non-zero if concurrent speedup is below this")
+    args = ap.parse_args()
+
+    url = args.url.rstrip("/") + args.path
+    for _ in range(args.warmup):
+        fetch(url)
+
+    single = statistics.median(fetch(url) for _ in range(5))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        t0 = time.perf_counter()
+        latencies = list(pool.map(fetch, [url] * args.concurrency))
+        wall = time.perf_counter() - t0
+
+    serialized = single * args.concurrency
+    speedup = serialized / wall
+    print(f"single request (median): {single * 1000:.1f} ms")
+    print(f"{args.concurrency} concurrent: wall {wall * 1000:.1f} ms, "
+          f"max latency {max(latencies) * 1000:.1f} ms")
+    print(f"speedup vs. fully serialized: {speedup:.1f}x")
+
+    if speedup < args.min_speedup:
+        print("FAIL: concurrent requests look serialized", file=sys.stderr)
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
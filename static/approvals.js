@@ -0,0 +1,81 @@
+// Live updates for /approvals. The server pushes {"status", "ids"} over
+// Server-Sent Events whenever entries enter or leave the queue: rows that
+// left are removed, newly submitted ones are fetched as rendered rows from
+// /approvals/rows (first page only) and added at the top. Anything the page
+// can't patch (ids: null, a resync, a dropped connection) shows a reload hint.
+(function () {
+  "use strict";
+  const table = document.getElementById("approvals");
+  if (!table || !table.dataset.events || !window.EventSource) return;
+  const body = table.tBodies[0];
+  const notice = document.getElementById("approvals-stale");
+
+  function stale() {
+    notice.hidden = false;
+  }
+
+  function removeRows(ids) {
+    for (const id of ids) {
+      const row = body.querySelector(`tr[data-id="${id}"]`);
+      if (row) row.remove();
+    }
+    // group headers with no entries left under them
+    for (const head of body.querySelectorAll("tr.group")) {
+      if (!body.querySelector(`tr[data-id][data-group="${head.dataset.group}"]`)) head.remove();
+    }
+    if (!body.querySelector("tr[data-id]") && !body.querySelector("tr.empty")) {
+      body.insertAdjacentHTML("beforeend",
+        '<tr class="empty"><td colspan="7" class="muted">Nothing submitted.</td></tr>');
+    }
+  }
+
+  async function addRows(ids) {
+    if (!table.dataset.rows) return stale();
+    const url = new URL(table.dataset.rows, location.href);
+    for (const id of ids) url.searchParams.append("ids", id);
+    const resp = await fetch(url, { headers: { Accept: "text/html" } });
+    if (!resp.ok) return stale();
+    const html = (await resp.text()).trim();
+    if (!html) return;  // none of them match this page's filters
+    removeRows(ids);
+    const rows = document.createElement("tbody");
+    rows.innerHTML = html;
+    body.querySelector("tr.empty")?.remove();
+    // entries go under their person/week header if the page has it, new
+    // groups go to the top in the order the server sent them
+    let top = null;
+    let prev = null;
+    let newGroup = false;
+    for (const row of Array.from(rows.children)) {
+      row.classList.add("new");
+      if (row.classList.contains("group")) {
+        const existing = body.querySelector(`tr.group[data-group="${row.dataset.group}"]`);
+        newGroup = !existing;
+        if (existing) {
+          prev = existing;
+          continue;
+        }
+        if (top) top.after(row);
+        else body.prepend(row);
+      } else {
+        prev.after(row);
+      }
+      prev = row;
+      if (newGroup) top = row;
+    }
+  }
+
+  const source = new EventSource(table.dataset.events);
+  let opened = false;
+  source.onopen = () => {
+    // reconnected: whatever was sent meanwhile is lost
+    if (opened) stale();
+    opened = true;
+  };
+  source.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (!msg.ids || msg.status === "resync") return stale();
+    if (msg.status === "submitted") addRows(msg.ids).catch(stale);
+    else removeRows(msg.ids);
+  };
+})();
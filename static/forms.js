@@ -0,0 +1,37 @@
+// Idempotency keys for POST forms. Each submission gets a fresh random key in
+// a hidden idempotency_key field, so a double-click is answered once, while
+// the next submission from the same page (cached or not) is a new request.
+// Forms a script posts itself (the submit event was cancelled) are left to
+// that script; my_week.js takes its keys from idempotencyKey() below.
+(function () {
+  "use strict";
+  if (!window.crypto || !crypto.getRandomValues) return;
+
+  function idempotencyKey() {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    return Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+  }
+  window.idempotencyKey = idempotencyKey;
+
+  document.addEventListener("submit", (event) => {
+    const form = event.target;
+    if (event.defaultPrevented || form.method !== "post") return;
+    // a second click while the page is still on its way out resends the key
+    if (form.dataset.keyed) return;
+    let input = form.elements.idempotency_key;
+    if (!input) {
+      input = document.createElement("input");
+      input.type = "hidden";
+      input.name = "idempotency_key";
+      form.append(input);
+    }
+    input.value = idempotencyKey();
+    form.dataset.keyed = "true";
+  });
+
+  // back/forward cache: the page comes back as it was left, keys and all
+  window.addEventListener("pageshow", (event) => {
+    if (!event.persisted) return;
+    for (const form of document.querySelectorAll("form[data-keyed]")) delete form.dataset.keyed;
+  });
+})();
@@ -0,0 +1,101 @@
+// In-place edits for /my-week. Adds, edits and deletes are posted with an
+// X-Partial header, so the server answers with just the entry's row (or 204
+// for a delete) instead of redirecting to a full re-render of the week; the
+// totals at the top are recomputed from the rows on the page. Without this
+// script the same forms post normally.
+(function () {
+  "use strict";
+  const grid = document.getElementById("week-grid");
+  if (!grid || !window.fetch) return;
+  const total = document.getElementById("week-total");
+  const weekStatus = document.getElementById("week-status");
+
+  // same rules as queries.week_status
+  function refreshTotals() {
+    let hours = 0;
+    const statuses = [];
+    for (const row of grid.querySelectorAll(".row[data-id]")) {
+      hours += parseFloat(row.dataset.hours) || 0;
+      statuses.push(row.dataset.status);
+    }
+    total.textContent = hours.toFixed(2);
+    if (statuses.length && statuses.every((s) => s === "approved")) weekStatus.textContent = "approved";
+    else weekStatus.textContent = statuses.includes("submitted") ? "submitted" : "draft";
+  }
+
+  function fromHtml(html) {
+    const holder = document.createElement("div");
+    holder.innerHTML = html.trim();
+    return holder.firstElementChild;
+  }
+
+  async function post(form, action) {
+    form.classList.add("saving");
+    try {
+      // each save is a new request, so it gets a key of its own (forms.js)
+      const headers = { "X-Partial": "row" };
+      if (window.idempotencyKey) headers["Idempotency-Key"] = idempotencyKey();
+      const resp = await fetch(action, { method: "POST", body: new FormData(form), headers });
+      // gone, or no longer a draft: the page is out of date
+      if (resp.status === 404) return location.reload();
+      if (!resp.ok) throw new Error(resp.statusText);
+      return resp.status === 204 ? "" : await resp.text();
+    } catch (err) {
+      form.classList.add("error");
+      form.title = `Not saved: ${err.message}`;
+      return null;
+    } finally {
+      form.classList.remove("saving");
+    }
+  }
+
+  async function save(form) {
+    const hours = form.elements.hours;
+    const notes = form.elements.notes;
+    if (!hours.checkValidity()) return hours.reportValidity();
+    if (hours.value === hours.defaultValue && notes.value === notes.defaultValue) return;
+    // marks the values as sent, so the change event and the submit that
+    // Enter fires together save once
+    const saved = [hours.defaultValue, notes.defaultValue];
+    hours.defaultValue = hours.value;
+    notes.defaultValue = notes.value;
+    const html = await post(form, form.action);
+    if (html === null) [hours.defaultValue, notes.defaultValue] = saved;
+    else if (html) form.replaceWith(fromHtml(html));
+    refreshTotals();
+  }
+
+  async function remove(form, action) {
+    const entries = form.parentElement;
+    if ((await post(form, action)) === null) return;
+    form.remove();
+    if (!entries.querySelector(".row")) entries.innerHTML = '<p class="muted empty">No entries.</p>';
+    refreshTotals();
+  }
+
+  async function add(form) {
+    const html = await post(form, form.action);
+    if (!html) return;
+    const entries = form.closest(".day").querySelector(".entries");
+    entries.querySelector(".empty")?.remove();
+    entries.append(fromHtml(html));
+    form.elements.hours.value = "";
+    form.elements.notes.value = "";
+    refreshTotals();
+  }
+
+  grid.addEventListener("submit", (event) => {
+    const form = event.target;
+    const submitter = event.submitter;
+    event.preventDefault();
+    if (form.classList.contains("add-row")) add(form);
+    else if (submitter && submitter.hasAttribute("formaction")) remove(form, submitter.formAction);
+    else save(form);
+  });
+
+  // leaving a changed hours/notes field saves it, no button needed
+  grid.addEventListener("change", (event) => {
+    const form = event.target.form;
+    if (form && form.classList.contains("row")) save(form);
+  });
+})();